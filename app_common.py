@@ -0,0 +1,160 @@
+import threading
+import time
+
+import streamlit as st
+
+from driver_pool import DriverPool
+from wind_scraper import STATUS_CACHED
+from scrape_executor import HostRateLimiter
+from wind_sources import SeleniumWindSource, HttpForecastSource, FallbackWindSource
+from forecast_cache import ForecastCache
+from forecast_store import ForecastStore, StoreFirstCache, STATUS_PREFETCHED
+from scrape_jobs import JobQueue
+from forecast_steps import scrape_native_steps, STATUS_INTERPOLATED
+from forecast_refresh import refresh_plan, frame_queries, forecast_diff, merge_refresh, WriteOnlyCache
+
+DRIVER_POOL_SIZE = 3
+MAX_PAGES_PER_DRIVER = 50
+# recycle a driver once its browser processes hold more than this much memory
+MAX_DRIVER_RSS_MB = 700
+# start drivers with the lean scraping profile of driver_pool, off until it is verified against the live map
+LEAN_DRIVERS = False
+# one worker per pooled driver, more would only queue for a driver
+MAX_WORKERS = DRIVER_POOL_SIZE
+# minimum seconds between two page loads against windfinder
+MIN_REQUEST_INTERVAL = 0.5
+# read the forecast data endpoint first and only render the map for what it could not answer.
+# Off until FORECAST_URL and its fields are confirmed against the live site
+USE_HTTP_FORECAST = False
+CACHE_PATH = 'wind_cache.sqlite'
+# forecasts fetched within this many seconds are served from the cache
+CACHE_TTL = 3 * 3600
+CACHE_MAX_ENTRIES = 20000
+# forecasts written by prefetch.py, answered before the cache and the scrapers
+STORE_PATH = 'forecast_store'
+STORE_FORMAT = 'csv'
+# prefetched forecasts older than this many seconds are scraped again
+STORE_MAX_AGE = 12 * 3600
+# scrape jobs that can run at the same time, each uses up to MAX_WORKERS drivers
+JOB_WORKERS = 1
+# seconds between two looks at a running job
+JOB_POLL_INTERVAL = 1.0
+# hours offered for every position. The defaults are model steps, each one scrape, the hours in
+# between are interpolated from the two steps around them (see forecast_steps)
+AVAILABLE_HOURS = ['09:00', '12:00', '15:00', '18:00', '14:00', '17:00']
+DEFAULT_HOURS = ['09:00', '12:00', '15:00', '18:00']
+
+
+# Drivers are shared by every rerun and session of the app. They start in the background,
+# so the first scrape does not wait for Firefox
+@st.cache_resource
+def get_driver_pool():
+    pool = DriverPool(size=DRIVER_POOL_SIZE, max_pages=MAX_PAGES_PER_DRIVER, max_rss_mb=MAX_DRIVER_RSS_MB,
+                      lean=LEAN_DRIVERS)
+    threading.Thread(target=pool.warm, name='warm-drivers', daemon=True).start()
+    return pool
+
+
+@st.cache_resource
+def get_wind_source():
+    selenium_source = SeleniumWindSource(get_driver_pool())
+    if not USE_HTTP_FORECAST:
+        return selenium_source
+    return FallbackWindSource(HttpForecastSource(pool_size=MAX_WORKERS), selenium_source)
+
+
+# The rate limit holds across all sessions hitting the same host
+@st.cache_resource
+def get_rate_limiter():
+    return HostRateLimiter(min_interval=MIN_REQUEST_INTERVAL)
+
+
+@st.cache_resource
+def get_forecast_cache():
+    return ForecastCache(CACHE_PATH, ttl=CACHE_TTL, max_entries=CACHE_MAX_ENTRIES)
+
+
+# Only what the prefetched store and the cache cannot answer gets scraped
+@st.cache_resource
+def get_forecast_lookup():
+    store = ForecastStore(STORE_PATH, STORE_FORMAT, max_age=STORE_MAX_AGE)
+    return StoreFirstCache(store, get_forecast_cache())
+
+
+# Scrape jobs live in the server process, not in the script run that started them
+@st.cache_resource
+def get_job_queue():
+    return JobQueue(workers=JOB_WORKERS)
+
+
+# The job this session started last, None before the first scrape or once it was pruned
+def current_job():
+    return get_job_queue().get(st.session_state.get('job_id'))
+
+
+def _submit(queries, cache, profile=False):
+    source = get_wind_source()
+    st.session_state.job_id = get_job_queue().submit(
+        queries, source.fetch_batch, max_workers=MAX_WORKERS, rate_limiter=get_rate_limiter(),
+        host=source.host, cache=cache, group=source.group, fallback=source.fallback, scrape=scrape_native_steps,
+        profile=profile)
+
+
+# Start scraping queries as a background job, so reruns do not lose it
+def submit_scrape(queries, profile=False):
+    _submit(queries, get_forecast_lookup(), profile)
+    st.session_state.refresh_base = None
+
+
+# Button that refetches only what went stale since the results on screen were fetched, nearest hours first
+def refresh_stale_button(name_column='name'):
+    if st.session_state.get('results') is None or not st.button('Refresh stale forecasts'):
+        return
+    lookup = get_forecast_lookup()
+    stale = refresh_plan(frame_queries(st.session_state.results, name_column), lookup.fetched_at)
+    if not stale:
+        st.info('Every forecast on screen is still fresh')
+        return
+    st.session_state.refresh_base = st.session_state.results
+    _submit(stale, WriteOnlyCache(lookup))
+
+
+# Show the progress of this session's job until it finishes and return its results, None without a job.
+# A rerun in the middle stops the polling, not the job, and the next run reattaches
+def poll_job(name_column='name'):
+    job = current_job()
+    if job is None:
+        return None
+    if not job.finished and st.button('Cancel'):
+        job.cancel()
+    progress_bar = st.progress(job.progress())
+    status_text = st.empty()
+    partial_results = st.empty()
+
+    while not job.finished:
+        progress_bar.progress(job.progress())
+        status_text.text(f'Job {job.id} ({job.done}/{job.total}): {job.message}')
+        partial_results.write(job.to_frame(name_column=name_column))
+        time.sleep(JOB_POLL_INTERVAL)
+    progress_bar.progress(job.progress())
+    status_text.text(f'Job {job.id}: {job.message}')
+    partial_results.empty()
+    output = job.to_frame(name_column=name_column)
+
+    # A refresh job only holds the stale forecasts, show what changed and merge them into the last results
+    refresh_base = st.session_state.get('refresh_base')
+    if refresh_base is not None:
+        changes = forecast_diff(refresh_base, output)
+        st.write(f"Refreshed {len(output)} of {len(refresh_base)} forecasts, "
+                 f"{len(changes)} changed since the last fetch")
+        st.write(changes)
+        output = merge_refresh(refresh_base, output)
+    st.session_state.results = output
+
+    cache_hits = int((output['status'] == STATUS_CACHED).sum())
+    prefetched = int((output['status'] == STATUS_PREFETCHED).sum())
+    interpolated = int((output['status'] == STATUS_INTERPOLATED).sum())
+    # the job counts its fetches, they include the model steps scraped only to interpolate hours between them
+    st.write(f"Prefetched: {prefetched}, cache: {cache_hits} hits, {job.fetched} forecasts fetched, "
+             f"{interpolated} interpolated between model steps")
+    return output
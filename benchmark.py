@@ -0,0 +1,183 @@
+import argparse
+import datetime
+import json
+import os
+import tempfile
+import threading
+import time
+import tracemalloc
+
+import numpy as np
+
+from scrape_executor import WindQuery, HostRateLimiter, scrape_grid
+from replay_server import start_replay_server, load_recording, save_recording
+from wind_sources import ReplayWindSource, SeleniumWindSource, HttpForecastSource
+from wind_scraper import STATUS_OK, STATUS_CACHED
+from forecast_cache import ForecastCache
+from driver_pool import DriverPool
+
+# Spread of the default benchmark positions, around the Ionian harbours of wind_app_v1
+CENTER = (38.55, 20.72)
+SPREAD = 0.25
+
+
+def make_grid(n_positions, n_dates, n_hours, seed=0):
+    rng = np.random.default_rng(seed)
+    lats = CENTER[0] + rng.uniform(-SPREAD, SPREAD, n_positions)
+    lons = CENTER[1] + rng.uniform(-SPREAD, SPREAD, n_positions)
+    start = datetime.date.today()
+    dates = [start + datetime.timedelta(days=d) for d in range(n_dates)]
+    hours = [f'{h:02d}:00' for h in range(9, 24, 3)][:n_hours]
+    return [WindQuery(f'p{i}', round(float(lat), 4), round(float(lon), 4), date, hour)
+            for date in dates for hour in hours for i, (lat, lon) in enumerate(zip(lats, lons))]
+
+
+# Scrape one grid through scrape_grid, what scrape_rows returns for every query
+def scrape_rows(source, queries, workers, min_interval=0.0, batch=True, cache=None, fetch=None):
+    rate_limiter = HostRateLimiter(min_interval) if min_interval > 0 else None
+    group = source.group if batch else (lambda qs: [[q] for q in qs])
+    return list(scrape_grid(queries, fetch or source.fetch_batch, max_workers=workers, rate_limiter=rate_limiter,
+                            host=source.host, cache=cache, group=group))
+
+
+# Scrape one grid and measure it. Latency is per fetch call (one batch), as seen by a worker.
+# Throughput is timed without tracemalloc, the Python heap peak comes from a second scrape of the
+# same grid with a fresh cache from make_cache, so tracing does not slow the timed run down
+def run_case(source, queries, workers, min_interval=0.0, batch=True, make_cache=None, pool=None, recorded=None):
+    latencies = []
+    lock = threading.Lock()
+
+    def fetch(batch_queries):
+        started = time.perf_counter()
+        readings = source.fetch_batch(batch_queries)
+        with lock:
+            latencies.append(time.perf_counter() - started)
+        return readings
+
+    cache = make_cache() if make_cache else None
+    started = time.perf_counter()
+    rows = scrape_rows(source, queries, workers, min_interval, batch, cache, fetch)
+    elapsed = time.perf_counter() - started
+    ok = sum(error is None and reading.status in (STATUS_OK, STATUS_CACHED) for _, reading, error in rows)
+    if recorded is not None:
+        recorded.extend((query.lat, query.lon, query.date, query.hour, reading)
+                        for query, reading, error in rows if error is None and reading.status == STATUS_OK)
+    # only the drivers' own processes, what ru_maxrss of this process would never see
+    browser_rss = [round(rss, 1) for rss in pool.browser_rss() if rss is not None] if pool else []
+
+    cache = make_cache() if make_cache else None
+    tracemalloc.start()
+    scrape_rows(source, queries, workers, min_interval, batch, cache)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        'backend': source.name,
+        'queries': len(queries),
+        'workers': workers,
+        'batched': batch,
+        'fetches': len(latencies),
+        'ok': int(ok),
+        'seconds': round(elapsed, 3),
+        'queries_per_sec': round(len(queries) / elapsed, 2) if elapsed else None,
+        'p50_latency': round(float(np.percentile(latencies, 50)), 3) if latencies else None,
+        'p95_latency': round(float(np.percentile(latencies, 95)), 3) if latencies else None,
+        # Python heap of the whole scrape, shared by all workers
+        'python_peak_kib': round(peak / 1024, 1),
+        'browser_rss_mib': browser_rss,
+    }
+
+
+# Cache cases of one grid: no cache, an empty cache and a cache that already holds the grid
+def cache_cases(source, queries, workers, batch, directory):
+    def empty():
+        fd, path = tempfile.mkstemp(suffix='.sqlite', dir=directory)
+        os.close(fd)
+        return ForecastCache(path)
+
+    def filled():
+        cache = empty()
+        scrape_rows(source, queries, workers, batch=batch, cache=cache)
+        return cache
+
+    return {'none': None, 'cold': empty, 'warm': filled}
+
+
+def parse_size(size):
+    positions, dates, hours = (int(v) for v in size.lower().split('x'))
+    return positions, dates, hours
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure scrape throughput for grid sizes and worker counts')
+    parser.add_argument('--backend', choices=['replay', 'http', 'selenium'], default='replay')
+    parser.add_argument('--sizes', default='7x2x3,20x5x3', help='comma separated positions x dates x hours')
+    parser.add_argument('--workers', default='1,2,4,8', help='comma separated worker counts')
+    parser.add_argument('--latency', type=float, default=0.3, help='replay/http: seconds per request')
+    parser.add_argument('--jitter', type=float, default=0.1, help='replay/http: random extra seconds per request')
+    parser.add_argument('--point-latency', type=float, default=0.02, help='replay: extra seconds per point')
+    parser.add_argument('--recording', help='replay: recorded readings to serve')
+    parser.add_argument('--record', help='write the readings scraped by the timed runs to this file, '
+                                         'a recording for --recording, e.g. from a selenium run')
+    parser.add_argument('--fixtures', help='http: directory of captured forecast JSON to serve')
+    parser.add_argument('--min-interval', type=float, default=0.0, help='rate limit between fetch starts')
+    parser.add_argument('--cache', default='none', help='comma separated cache cases out of none, cold, warm')
+    parser.add_argument('--pool', default='warm',
+                        help='selenium: comma separated pool cases, cold starts the drivers inside the timed run, '
+                             'warm starts them before it')
+    parser.add_argument('--lean', action='store_true',
+                        help='selenium: the lean scraping profile instead of plain Firefox, to compare the two')
+    parser.add_argument('--no-batch', action='store_true', help='one fetch per query instead of per batch')
+    parser.add_argument('--json', help='also write the results to this file')
+    args = parser.parse_args()
+
+    worker_counts = [int(w) for w in args.workers.split(',')]
+    pool_cases = args.pool.split(',') if args.backend == 'selenium' else ['-']
+    source = None
+    if args.backend == 'replay':
+        server = start_replay_server(load_recording(args.recording), args.latency, args.jitter, args.point_latency)
+        source = ReplayWindSource(f'http://127.0.0.1:{server.server_port}')
+    elif args.backend == 'http':
+        server = start_replay_server(latency=args.latency, jitter=args.jitter, fixtures=args.fixtures)
+        source = HttpForecastSource(f'http://127.0.0.1:{server.server_port}/forecast', pool_size=max(worker_counts))
+
+    results = []
+    recorded = [] if args.record else None
+    with tempfile.TemporaryDirectory(prefix='benchmark-cache-') as cache_dir:
+        for size in args.sizes.split(','):
+            queries = make_grid(*parse_size(size))
+            for workers in worker_counts:
+                for pool_case in pool_cases:
+                    pool = None
+                    if args.backend == 'selenium':
+                        # a pool per case, so a cold case really starts its drivers while timed
+                        pool = DriverPool(size=workers, lean=args.lean)
+                        if pool_case == 'warm':
+                            pool.warm()
+                        source = SeleniumWindSource(pool)
+                    cases = cache_cases(source, queries, workers, not args.no_batch, cache_dir)
+                    try:
+                        for cache_case in args.cache.split(','):
+                            result = run_case(source, queries, workers, args.min_interval, batch=not args.no_batch,
+                                              make_cache=cases[cache_case], pool=pool, recorded=recorded)
+                            result.update(grid=size, cache=cache_case, pool=pool_case)
+                            results.append(result)
+                            print(f"{size:>10} workers={workers:<3} cache={cache_case:<5} pool={pool_case:<5} "
+                                  f"{result['queries_per_sec']:>8} q/s  "
+                                  f"p50={result['p50_latency']}s p95={result['p95_latency']}s  "
+                                  f"ok={result['ok']}/{result['queries']}  fetches={result['fetches']}  "
+                                  f"heap={result['python_peak_kib']} KiB"
+                                  + (f"  browsers={result['browser_rss_mib']} MiB" if pool is not None else ''))
+                    finally:
+                        if pool is not None:
+                            pool.close()
+
+    if args.record:
+        save_recording(args.record, recorded)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,230 @@
+import atexit
+import os
+import queue
+import threading
+import urllib.parse
+from contextlib import contextmanager
+from functools import lru_cache
+
+from selenium import webdriver
+from selenium.webdriver.firefox.options import Options as FirefoxOptions
+from selenium.webdriver.firefox.service import Service as FirefoxService
+from webdriver_manager.firefox import GeckoDriverManager
+
+from scrape_metrics import (metrics, STAGE_DRIVER_INSTALL, STAGE_DRIVER_LAUNCH, OUTCOME_DRIVER_CRASH,
+                            OUTCOME_DRIVER_MEMORY)
+
+# Every driver gets the same small window so map pixels can be computed ahead of time.
+# Still wide enough for a few harbours per viewport at the map zoom
+WINDOW_WIDTH = 1024
+WINDOW_HEIGHT = 768
+
+# Hosts the map needs, with their subdomains. Everything else (ads, analytics, social widgets)
+# is sent to a dead proxy by the lean profile. Add a host here if the map stops rendering
+ALLOWED_HOSTS = ('windfinder.com',)
+# Nothing listens here, blocked requests fail at once instead of timing out
+BLACKHOLE_PROXY = '127.0.0.1:9'
+
+# Firefox preferences of the lean scraping profile: no images, fonts, media or animations,
+# no disk or offline cache (the memory cache stays, every page load of a driver reuses the map's
+# scripts and tiles from it), no telemetry, update checks or background connections
+LEAN_PREFS = {
+    'permissions.default.image': 2,
+    'gfx.downloadable_fonts.enabled': False,
+    'media.autoplay.default': 5,
+    'media.autoplay.blocking_policy': 2,
+    'browser.cache.disk.enable': False,
+    'browser.cache.offline.enable': False,
+    'browser.sessionhistory.max_entries': 1,
+    'browser.sessionhistory.max_total_viewers': 0,
+    'browser.sessionstore.resume_from_crash': False,
+    'ui.prefersReducedMotion': 1,
+    'toolkit.cosmeticAnimations.enabled': False,
+    'layout.frame_rate': 10,
+    'privacy.trackingprotection.enabled': True,
+    'toolkit.telemetry.enabled': False,
+    'toolkit.telemetry.unified': False,
+    'toolkit.telemetry.archive.enabled': False,
+    'datareporting.healthreport.uploadEnabled': False,
+    'datareporting.policy.dataSubmissionEnabled': False,
+    'app.shield.optoutstudies.enabled': False,
+    'app.normandy.enabled': False,
+    'app.update.auto': False,
+    'extensions.update.enabled': False,
+    'browser.safebrowsing.malware.enabled': False,
+    'browser.safebrowsing.phishing.enabled': False,
+    'browser.newtabpage.enabled': False,
+    'browser.startup.page': 0,
+    'network.prefetch-next': False,
+    'network.dns.disablePrefetch': True,
+    'network.http.speculative-parallel-limit': 0,
+    'dom.ipc.processCount': 1,
+    'fission.autostart': False,
+}
+
+
+# Resolve (and download if needed) the gecko driver only once per process
+@lru_cache(maxsize=None)
+def get_gecko_path():
+    with metrics.stage(STAGE_DRIVER_INSTALL):
+        return GeckoDriverManager().install()
+
+
+# Proxy auto-config sending every host outside `allowed_hosts` to the blackhole proxy
+def blocking_pac(allowed_hosts=ALLOWED_HOSTS, proxy=BLACKHOLE_PROXY):
+    checks = ' || '.join(f'host == "{host}" || dnsDomainIs(host, ".{host}")' for host in allowed_hosts)
+    script = (f'function FindProxyForURL(url, host) {{ '
+              f'if (host == "localhost" || host == "127.0.0.1" || {checks}) {{ return "DIRECT"; }} '
+              f'return "PROXY {proxy}"; }}')
+    return 'data:text/javascript,' + urllib.parse.quote(script)
+
+
+# Start a new headless Firefox, with the lean scraping profile when lean is set.
+# The profile is opt-in until a benchmark run shows the map still renders and the tooltip still reads with it
+def new_driver(lean=False):
+    options = FirefoxOptions()
+    options.add_argument('--headless')
+    options.add_argument('--disable-gpu')
+    options.add_argument(f'--width={WINDOW_WIDTH}')
+    options.add_argument(f'--height={WINDOW_HEIGHT}')
+    if lean:
+        for name, value in LEAN_PREFS.items():
+            options.set_preference(name, value)
+        options.set_preference('network.proxy.type', 2)
+        options.set_preference('network.proxy.autoconfig_url', blocking_pac())
+    service = FirefoxService(executable_path=get_gecko_path())
+    with metrics.stage(STAGE_DRIVER_LAUNCH):
+        return webdriver.Firefox(service=service, options=options)
+
+
+# Resident memory of the browser and its content processes in MiB, None where /proc is not available
+def browser_rss_mb(driver):
+    pid = driver.capabilities.get('moz:processID')
+    if pid is None or not os.path.isdir('/proc'):
+        return None
+    children = {}
+    rss_kb = {}
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/status') as f:
+                fields = dict(line.split(':', 1) for line in f if ':' in line)
+        except OSError:
+            # the process ended while we were looking
+            continue
+        children.setdefault(int(fields['PPid']), []).append(int(entry))
+        rss_kb[int(entry)] = int(fields.get('VmRSS', '0 kB').split()[0])
+    total = 0
+    stack = [pid]
+    while stack:
+        current = stack.pop()
+        total += rss_kb.get(current, 0)
+        stack.extend(children.get(current, ()))
+    return total / 1024
+
+
+def quit_driver(driver):
+    try:
+        driver.quit()
+    except Exception:
+        # the browser may already be gone after a crash
+        pass
+
+
+class DriverPool:
+    # A bounded pool of long-lived Firefox drivers.
+    # At most `size` drivers exist at once, a driver is checked out for one query at a time
+    # and is recycled after `max_pages` page loads, when the query using it raised, or when
+    # its browser grew past `max_rss_mb` (checked every `memory_check_every` checkouts).
+
+    def __init__(self, size=3, max_pages=50, max_rss_mb=None, memory_check_every=5, lean=False):
+        self.size = size
+        self.max_pages = max_pages
+        self.max_rss_mb = max_rss_mb
+        self.memory_check_every = memory_check_every
+        self.lean = lean
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._pages = {}
+        self._lock = threading.Lock()
+        self._closed = False
+        atexit.register(self.close)
+
+    @contextmanager
+    def driver(self):
+        self._slots.acquire()
+        try:
+            try:
+                driver = self._idle.get_nowait()
+            except queue.Empty:
+                driver = new_driver(self.lean)
+                with self._lock:
+                    self._pages[driver] = 0
+        except Exception:
+            self._slots.release()
+            raise
+
+        healthy = False
+        try:
+            yield driver
+            healthy = True
+        finally:
+            with self._lock:
+                self._pages[driver] += 1
+                pages = self._pages[driver]
+                recycle = not healthy or self._closed or pages >= self.max_pages
+            if not recycle and self.max_rss_mb is not None and pages % self.memory_check_every == 0:
+                rss_mb = browser_rss_mb(driver)
+                if rss_mb is not None and rss_mb > self.max_rss_mb:
+                    recycle = True
+                    metrics.count(OUTCOME_DRIVER_MEMORY)
+            if recycle:
+                with self._lock:
+                    del self._pages[driver]
+            if not healthy:
+                metrics.count(OUTCOME_DRIVER_CRASH)
+            if recycle:
+                quit_driver(driver)
+            else:
+                self._idle.put(driver)
+            self._slots.release()
+
+    # Start drivers ahead of the first query so it does not pay the cold start. Each start holds a
+    # slot like a checkout, so warming next to running queries never exceeds `size` drivers
+    def warm(self, count=None):
+        count = self.size if count is None else min(count, self.size)
+        for _ in range(count):
+            if not self._slots.acquire(blocking=False):
+                return
+            try:
+                with self._lock:
+                    if len(self._pages) >= count:
+                        return
+                driver = new_driver(self.lean)
+                with self._lock:
+                    self._pages[driver] = 0
+                self._idle.put(driver)
+            finally:
+                self._slots.release()
+
+    def stats(self):
+        with self._lock:
+            return {'size': self.size, 'alive': len(self._pages), 'idle': self._idle.qsize()}
+
+    # Browser memory in MiB of each idle driver, the drivers checked out right now are skipped
+    def browser_rss(self):
+        with self._idle.mutex:
+            drivers = list(self._idle.queue)
+        return [browser_rss_mb(driver) for driver in drivers]
+
+    def close(self):
+        self._closed = True
+        while True:
+            try:
+                driver = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            with self._lock:
+                self._pages.pop(driver, None)
+            quit_driver(driver)
@@ -0,0 +1,86 @@
+import sqlite3
+import threading
+import time
+
+from wind_scraper import WindReading, STATUS_CACHED
+
+# Positions closer than this many decimals share a cache entry (~100m)
+COORD_DECIMALS = 3
+
+
+class ForecastCache:
+    # SQLite cache of wind readings keyed by rounded position, forecast date and hour.
+    # get ignores entries older than `ttl` seconds, but they stay stored with their fetch time
+    # for fetched_at until the oldest entries are evicted once more than `max_entries` are stored
+
+    def __init__(self, path='wind_cache.sqlite', ttl=3 * 3600, max_entries=20000):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute('''
+                CREATE TABLE IF NOT EXISTS forecasts (
+                    lat REAL NOT NULL,
+                    lon REAL NOT NULL,
+                    date TEXT NOT NULL,
+                    hour TEXT NOT NULL,
+                    speed INTEGER,
+                    direction TEXT,
+                    direction_deg INTEGER,
+                    fetched_at REAL NOT NULL,
+                    PRIMARY KEY (lat, lon, date, hour)
+                )''')
+            self._conn.execute('CREATE INDEX IF NOT EXISTS forecasts_fetched_at ON forecasts (fetched_at)')
+
+    @staticmethod
+    def key(lat, lon, date, hour):
+        return round(float(lat), COORD_DECIMALS), round(float(lon), COORD_DECIMALS), str(date), str(hour)
+
+    def get(self, lat, lon, date, hour):
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT speed, direction, direction_deg FROM forecasts '
+                'WHERE lat = ? AND lon = ? AND date = ? AND hour = ? AND fetched_at >= ?',
+                (*self.key(lat, lon, date, hour), time.time() - self.ttl)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return WindReading(*row, STATUS_CACHED)
+
+    # When the entry was fetched, also past the TTL as long as it has not been evicted
+    def fetched_at(self, lat, lon, date, hour):
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT fetched_at FROM forecasts WHERE lat = ? AND lon = ? AND date = ? AND hour = ?',
+                self.key(lat, lon, date, hour)).fetchone()
+        return None if row is None else row[0]
+
+    def put(self, lat, lon, date, hour, reading, fetched_at=None):
+        fetched_at = time.time() if fetched_at is None else fetched_at
+        with self._lock, self._conn:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO forecasts VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (*self.key(lat, lon, date, hour), reading.speed, reading.direction, reading.direction_deg,
+                 fetched_at))
+            self._evict()
+
+    def _evict(self):
+        excess = self._conn.execute('SELECT COUNT(*) FROM forecasts').fetchone()[0] - self.max_entries
+        if excess > 0:
+            self._conn.execute(
+                'DELETE FROM forecasts WHERE rowid IN '
+                '(SELECT rowid FROM forecasts ORDER BY fetched_at LIMIT ?)', (excess,))
+
+    def stats(self):
+        with self._lock:
+            entries = self._conn.execute('SELECT COUNT(*) FROM forecasts').fetchone()[0]
+        return {'hits': self.hits, 'misses': self.misses, 'entries': entries}
+
+    def clear(self):
+        with self._lock, self._conn:
+            self._conn.execute('DELETE FROM forecasts')
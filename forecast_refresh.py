@@ -0,0 +1,110 @@
+import datetime
+import time
+
+import numpy as np
+import pandas as pd
+
+from forecast_steps import FORECAST_STEP_HOURS, bracket, query_time, step_query
+from scrape_executor import WindQuery
+
+# How long a reading stays fresh, by hours until the forecast time: (up to lead hours, max age seconds).
+# Near-term forecasts move with every model run, a week out they hardly change between refreshes
+REFRESH_AGES = ((12, 3600), (48, 3 * 3600), (None, 12 * 3600))
+# Rows of two fetches are the same forecast when these match
+DIFF_KEYS = ['lat', 'lon', 'date', 'hour']
+
+
+def max_age(lead_hours, ages=REFRESH_AGES):
+    for up_to, age in ages:
+        if up_to is None or lead_hours <= up_to:
+            return age
+    return ages[-1][1]
+
+
+# The queries behind a results frame, to refresh what is on screen
+def frame_queries(frame, name_column='name'):
+    return [WindQuery(*row) for row in frame[[name_column, 'lat', 'lon', 'date', 'hour']].itertuples(index=False)]
+
+
+# When a query was last fetched, per fetched_at(lat, lon, date, hour) of the cache or store.
+# Hours between model steps that were not stored themselves are as old as the older step around them
+def query_fetched_at(query, fetched_at, step_hours=FORECAST_STEP_HOURS):
+    own = fetched_at(query.lat, query.lon, query.date, query.hour)
+    if own is not None:
+        return own
+    before, after, weight = bracket(query_time(query), step_hours)
+    if weight == 0:
+        return None
+    steps = [step_query(query, before), step_query(query, after)]
+    times = [fetched_at(step.lat, step.lon, step.date, step.hour) for step in steps]
+    return None if None in times else min(times)
+
+
+# The queries worth fetching again, nearest forecast time first: never fetched, or fetched longer
+# ago than their lead time allows. Hours already past are left alone
+def refresh_plan(queries, fetched_at, now=None, ages=REFRESH_AGES, step_hours=FORECAST_STEP_HOURS):
+    now = time.time() if now is None else now
+    # query hours are UTC, like the map URL
+    current = datetime.datetime.fromtimestamp(now, datetime.timezone.utc).replace(tzinfo=None)
+    stale = []
+    for query in queries:
+        moment = query_time(query)
+        if moment < current:
+            continue
+        lead_hours = (moment - current).total_seconds() / 3600
+        fetched = query_fetched_at(query, fetched_at, step_hours)
+        if fetched is None or now - fetched > max_age(lead_hours, ages):
+            stale.append((moment, query))
+    stale.sort(key=lambda item: item[0])
+    return [query for _, query in stale]
+
+
+class WriteOnlyCache:
+    # Stores what a refresh fetched without answering it from the stale entries it replaces
+
+    def __init__(self, cache):
+        self.cache = cache
+
+    def get(self, lat, lon, date, hour):
+        return None
+
+    def put(self, lat, lon, date, hour, reading, fetched_at=None):
+        self.cache.put(lat, lon, date, hour, reading, fetched_at)
+
+
+def _keyed(frame):
+    keys = frame[DIFF_KEYS].astype(str)
+    return frame.set_index(pd.MultiIndex.from_frame(keys))
+
+
+# The previous results with every row that the refresh fetched successfully replaced
+def merge_refresh(previous, refreshed):
+    previous, refreshed = _keyed(previous), _keyed(refreshed.dropna(subset=['speed']))
+    merged = pd.concat([previous[~previous.index.isin(refreshed.index)], refreshed])
+    return merged.reset_index(drop=True)
+
+
+# Forecasts whose speed or direction changed between two fetches, with both values and the change.
+# The direction change is the signed shorter turn, -180..180
+def forecast_diff(previous, refreshed):
+    previous, refreshed = _keyed(previous), _keyed(refreshed.dropna(subset=['speed']))
+    previous = previous[~previous.index.duplicated(keep='last')]
+    refreshed = refreshed[~refreshed.index.duplicated(keep='last')]
+    common = refreshed.index.intersection(previous.index)
+    before, after = previous.loc[common], refreshed.loc[common]
+
+    speed_before = before['speed'].to_numpy(dtype=float, na_value=np.nan)
+    speed_after = after['speed'].to_numpy(dtype=float, na_value=np.nan)
+    deg_before = before['direction_deg'].to_numpy(dtype=float, na_value=np.nan)
+    deg_after = after['direction_deg'].to_numpy(dtype=float, na_value=np.nan)
+    diff = after[[column for column in after.columns if column not in ('speed', 'direction', 'direction_deg',
+                                                                          'status')]].copy()
+    diff['speed_before'] = speed_before
+    diff['speed_after'] = speed_after
+    diff['speed_change'] = speed_after - speed_before
+    diff['direction_before'] = before['direction'].to_numpy()
+    diff['direction_after'] = after['direction'].to_numpy()
+    diff['direction_change'] = (deg_after - deg_before + 180) % 360 - 180
+    changed = (np.nan_to_num(diff['speed_change'].to_numpy(), nan=1) != 0) | \
+              (np.nan_to_num(diff['direction_change'].to_numpy(), nan=1) != 0)
+    return diff[changed].reset_index(drop=True)
@@ -0,0 +1,97 @@
+import datetime
+from collections import defaultdict
+
+from scrape_executor import WindQuery, scrape_grid
+from wind_scraper import WindReading, STATUS_ERROR
+from scrape_metrics import metrics
+from wind_sources import compass_point
+
+# hours between two forecast model steps, steps fall on 00:00, 03:00, ... UTC
+FORECAST_STEP_HOURS = 3
+# status of a reading derived from the model steps around it instead of scraped
+STATUS_INTERPOLATED = 'interpolated'
+
+
+def query_time(query):
+    return datetime.datetime.combine(datetime.date.fromisoformat(str(query.date)),
+                                     datetime.time.fromisoformat(query.hour))
+
+
+def step_query(query, moment):
+    return WindQuery(query.name, query.lat, query.lon, moment.date(), moment.strftime('%H:%M'))
+
+
+def query_key(query):
+    return query.lat, query.lon, str(query.date), query.hour
+
+
+# The model steps before and after an hour and how far the hour is between them (0..1)
+def bracket(moment, step_hours=FORECAST_STEP_HOURS):
+    step = datetime.timedelta(hours=step_hours)
+    midnight = datetime.datetime.combine(moment.date(), datetime.time())
+    before = midnight + ((moment - midnight) // step) * step
+    return before, before + step, (moment - before) / step
+
+
+# Linear in speed, along the shorter arc in direction so 350 and 10 meet at 0, not 180
+def interpolate_reading(before, after, weight):
+    if before.speed is None or after.speed is None or before.direction_deg is None or after.direction_deg is None:
+        failed = before if before.speed is None or before.direction_deg is None else after
+        return WindReading(None, None, None, failed.status)
+    turn = (after.direction_deg - before.direction_deg + 180) % 360 - 180
+    direction_deg = int(round(before.direction_deg + weight * turn)) % 360
+    speed = int(round(before.speed + weight * (after.speed - before.speed)))
+    return WindReading(speed, compass_point(direction_deg), direction_deg, STATUS_INTERPOLATED)
+
+
+# A reading from a cache or store only, never scraped: the query's own entry, else derived from the
+# cached model steps around it. None when neither is there
+def lookup_reading(cache, query, step_hours=FORECAST_STEP_HOURS):
+    reading = cache.get(query.lat, query.lon, query.date, query.hour)
+    if reading is not None:
+        return reading
+    before, after, weight = bracket(query_time(query), step_hours)
+    if weight == 0:
+        return None
+    readings = [cache.get(step.lat, step.lon, step.date, step.hour)
+                for step in (step_query(query, before), step_query(query, after))]
+    if None in readings:
+        return None
+    return interpolate_reading(readings[0], readings[1], weight)
+
+
+# scrape_grid that only scrapes native model steps. Requested hours between steps are derived
+# from the two steps around them once both are in, and carry STATUS_INTERPOLATED.
+# Yields (query, reading, error) for the requested queries only
+def scrape_native_steps(queries, fetch, step_hours=FORECAST_STEP_HOURS, **scrape_kwargs):
+    native = {}
+    answers = defaultdict(list)
+    derived = []
+    needs = defaultdict(list)
+    for query in queries:
+        before, after, weight = bracket(query_time(query), step_hours)
+        if weight == 0:
+            native.setdefault(query_key(query), query)
+            answers[query_key(query)].append(query)
+            continue
+        keys = []
+        for moment in (before, after):
+            step = step_query(query, moment)
+            native.setdefault(query_key(step), step)
+            keys.append(query_key(step))
+        for key in keys:
+            needs[key].append(len(derived))
+        derived.append((query, keys[0], keys[1], weight))
+
+    readings = {}
+    for step, reading, error in scrape_grid(list(native.values()), fetch, **scrape_kwargs):
+        key = query_key(step)
+        readings[key] = reading if error is None else WindReading(None, None, None, STATUS_ERROR)
+        for query in answers[key]:
+            yield query, reading, error
+        for index in needs[key]:
+            query, before_key, after_key, weight = derived[index]
+            if before_key in readings and after_key in readings:
+                reading = interpolate_reading(readings[before_key], readings[after_key], weight)
+                metrics.count(reading.status)
+                yield query, reading, None
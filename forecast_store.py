@@ -0,0 +1,144 @@
+import os
+import threading
+import time
+
+import pandas as pd
+
+from forecast_cache import COORD_DECIMALS
+from forecast_steps import STATUS_INTERPOLATED
+from wind_scraper import WindReading
+
+# status of a reading served from the prefetched store
+STATUS_PREFETCHED = 'prefetched'
+FORMATS = ('csv', 'parquet')
+COLUMNS = ['name', 'lat', 'lon', 'date', 'hour', 'speed', 'direction', 'direction_deg', 'status', 'fetched_at']
+
+
+class ForecastStore:
+    # Forecasts written by the prefetch runner, one file per forecast date:
+    # <root>/date=YYYY-MM-DD/forecast.csv (or .parquet). A partition keeps the latest reading
+    # of every position and hour. get() has the ForecastCache signature so the store can sit
+    # in front of the cache and only what it is missing gets scraped. Readings fetched more than
+    # `max_age` seconds ago are ignored by get(), None keeps them until the partition is rewritten
+
+    def __init__(self, root='forecast_store', fmt='csv', max_age=None):
+        if fmt not in FORMATS:
+            raise ValueError(f'Unknown store format {fmt!r}, expected one of {FORMATS}')
+        self.root = root
+        self.fmt = fmt
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        # date -> (mtime, {key: row}) of the partitions get() has read
+        self._indexes = {}
+
+    @staticmethod
+    def key(lat, lon, hour):
+        return round(float(lat), COORD_DECIMALS), round(float(lon), COORD_DECIMALS), str(hour)
+
+    def partition_path(self, date):
+        return os.path.join(self.root, f'date={date}', f'forecast.{self.fmt}')
+
+    def dates(self):
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(entry[len('date='):] for entry in os.listdir(self.root)
+                      if entry.startswith('date=') and os.path.exists(self.partition_path(entry[len('date='):])))
+
+    def _read_partition(self, date):
+        path = self.partition_path(date)
+        if not os.path.exists(path):
+            return pd.DataFrame(columns=COLUMNS)
+        if self.fmt == 'parquet':
+            return pd.read_parquet(path)
+        return pd.read_csv(path, dtype={'date': str, 'hour': str})
+
+    def read(self, dates=None):
+        dates = self.dates() if dates is None else [str(date) for date in dates]
+        frames = [self._read_partition(date) for date in dates]
+        frames = [frame for frame in frames if len(frame)]
+        if not frames:
+            return pd.DataFrame(columns=COLUMNS)
+        return pd.concat(frames, ignore_index=True)
+
+    # Merge a results frame (ResultBuffer.to_frame columns) into its date partitions.
+    # Rows without a speed are dropped so a failed scrape never replaces a good reading
+    def write(self, frame, fetched_at=None):
+        frame = frame.dropna(subset=['speed']).copy()
+        if not len(frame):
+            return 0
+        frame['date'] = frame['date'].astype(str)
+        frame['status'] = frame['status'].astype(str)
+        frame['fetched_at'] = time.time() if fetched_at is None else fetched_at
+        for date, rows in frame.groupby('date'):
+            merged = pd.concat([self._read_partition(date), rows[COLUMNS]], ignore_index=True)
+            keys = merged[['lat', 'lon']].astype(float).round(COORD_DECIMALS).assign(hour=merged['hour'].astype(str))
+            merged = merged[~keys.duplicated(keep='last')].sort_values(['hour', 'name']).reset_index(drop=True)
+
+            path = self.partition_path(date)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # written next to the partition and renamed over it, readers never see half a file
+            tmp = f'{path}.tmp'
+            if self.fmt == 'parquet':
+                merged.to_parquet(tmp, index=False)
+            else:
+                merged.to_csv(tmp, index=False)
+            os.replace(tmp, path)
+        return len(frame)
+
+    def _index(self, date):
+        path = self.partition_path(date)
+        mtime = os.path.getmtime(path) if os.path.exists(path) else None
+        cached = self._indexes.get(date)
+        if cached is None or cached[0] != mtime:
+            frame = self._read_partition(date)
+            index = {self.key(row.lat, row.lon, row.hour): row for row in frame.itertuples(index=False)}
+            cached = self._indexes[date] = (mtime, index)
+        return cached[1]
+
+    def get(self, lat, lon, date, hour):
+        with self._lock:
+            row = self._index(str(date)).get(self.key(lat, lon, hour))
+            if row is None or (self.max_age is not None and row.fetched_at < time.time() - self.max_age):
+                self.misses += 1
+                return None
+            self.hits += 1
+        direction_deg = None if pd.isna(row.direction_deg) else int(row.direction_deg)
+        # an interpolated hour stays one, every scraped reading is served as prefetched
+        status = STATUS_INTERPOLATED if row.status == STATUS_INTERPOLATED else STATUS_PREFETCHED
+        return WindReading(int(row.speed), row.direction, direction_deg, status)
+
+    def fetched_at(self, lat, lon, date, hour):
+        with self._lock:
+            row = self._index(str(date)).get(self.key(lat, lon, hour))
+        return None if row is None else float(row.fetched_at)
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'dates': len(self.dates())}
+
+
+class StoreFirstCache:
+    # Looks a reading up in the prefetched store, then in the forecast cache.
+    # New readings only go to the cache, the store is written by the prefetch runner
+
+    def __init__(self, store, cache):
+        self.store = store
+        self.cache = cache
+
+    def get(self, lat, lon, date, hour):
+        reading = self.store.get(lat, lon, date, hour)
+        if reading is None:
+            reading = self.cache.get(lat, lon, date, hour)
+        return reading
+
+    def put(self, lat, lon, date, hour, reading, fetched_at=None):
+        self.cache.put(lat, lon, date, hour, reading, fetched_at)
+
+    def fetched_at(self, lat, lon, date, hour):
+        times = [t for t in (self.store.fetched_at(lat, lon, date, hour), self.cache.fetched_at(lat, lon, date, hour))
+                 if t is not None]
+        return max(times) if times else None
+
+    def stats(self):
+        return {'store': self.store.stats(), 'cache': self.cache.stats()}
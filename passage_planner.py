@@ -0,0 +1,163 @@
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from forecast_steps import lookup_reading
+from route_profile import distance_nm, DEFAULT_BOAT_SPEED_KTS
+from scrape_executor import WindQuery
+
+# Closer than this to the wind (degrees off the bow) the boat has to tack
+NO_GO_ANGLE = 40
+# distance actually sailed when tacking up a leg, as a multiple of the straight line
+TACKING_FACTOR = 1.5
+# every knot of wind component on the nose makes a leg this much slower
+HEADWIND_PENALTY = 0.04
+# below this the boat motors, which is slower than sailing a breeze
+MIN_SAILING_WIND_KTS = 5
+MOTORING_FACTOR = 1.2
+# forecasts only give the mean wind, gusts are taken as this multiple of the day's strongest hour
+GUST_FACTOR = 1.4
+GUST_LIMIT_KTS = 30
+# shortest and longest leg worth planning for one day
+MIN_LEG_NM = 3
+MAX_LEG_NM = 30
+# score added to a leg straight back to the harbour of the day before, so a trip moves on
+# instead of going back and forth, yet an out-and-back stays possible
+RETURN_PENALTY = 0.5
+
+# Cost and conditions of every leg from position i to position j on day d, arrays of shape
+# (positions, positions, dates). cost is in hours underway, score is how much slower than flat water
+# every mile of the leg is (1 = a free breeze, higher = headwind, tacking or motoring), independent of
+# the leg's length. Both are inf where the leg is not an option
+PassageMatrix = namedtuple('PassageMatrix', ['names', 'dates', 'cost', 'score', 'distance_nm', 'bearing_deg',
+                                             'wind_speed', 'wind_direction_deg', 'true_wind_angle', 'gust'])
+
+
+# Initial great-circle bearing from 1 to 2, 0 = north, broadcasts like distance_nm
+def bearing_deg(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(v, dtype=float)) for v in (lat1, lon1, lat2, lon2))
+    y = np.sin(lon2 - lon1) * np.cos(lat2)
+    x = np.cos(lat1) * np.sin(lat2) - np.sin(lat1) * np.cos(lat2) * np.cos(lon2 - lon1)
+    return np.degrees(np.arctan2(y, x)) % 360
+
+
+# Cached wind at every position, date and hour as (speed, direction_deg) arrays of shape
+# (positions, dates, hours), NaN where nothing is cached. Nothing is scraped
+def cached_wind(positions, dates, hours, cache):
+    names = list(positions)
+    speed = np.full((len(names), len(dates), len(hours)), np.nan)
+    direction_deg = np.full_like(speed, np.nan)
+    for p, name in enumerate(names):
+        lat, lon = positions[name]
+        for d, date in enumerate(dates):
+            for h, hour in enumerate(hours):
+                reading = lookup_reading(cache, WindQuery(name, lat, lon, date, hour))
+                if reading is not None and reading.speed is not None and reading.direction_deg is not None:
+                    speed[p, d, h] = reading.speed
+                    direction_deg[p, d, h] = reading.direction_deg
+    return speed, direction_deg
+
+
+# The whole position x position x date matrix in one pass. Wind on a leg is the mean of the day's
+# hours at both ends, speed as a scalar and direction through its vector
+def passage_matrix(positions, dates, speed, direction_deg, boat_speed_kts=DEFAULT_BOAT_SPEED_KTS,
+                   gust_limit_kts=GUST_LIMIT_KTS, min_leg_nm=MIN_LEG_NM, max_leg_nm=MAX_LEG_NM):
+    names = list(positions)
+    coords = np.array([positions[name] for name in names], dtype=float).reshape(-1, 2)
+    lat, lon = coords[:, 0], coords[:, 1]
+    distance = distance_nm(lat[:, None], lon[:, None], lat[None, :], lon[None, :])
+    bearing = bearing_deg(lat[:, None], lon[:, None], lat[None, :], lon[None, :])
+
+    known = ~np.isnan(speed)
+    hours_known = known.sum(axis=2)
+    radians = np.radians(np.where(known, direction_deg, 0))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        day_speed = np.where(known, speed, 0).sum(axis=2) / hours_known
+        east = np.where(known, np.sin(radians), 0).sum(axis=2) / hours_known
+        north = np.where(known, np.cos(radians), 0).sum(axis=2) / hours_known
+    day_peak = np.where(hours_known > 0, np.where(known, speed, -np.inf).max(axis=2), np.nan)
+
+    # (positions, dates) -> legs (from, to, dates)
+    wind_speed = (day_speed[:, None, :] + day_speed[None, :, :]) / 2
+    wind_direction = np.degrees(np.arctan2(east[:, None, :] + east[None, :, :],
+                                           north[:, None, :] + north[None, :, :])) % 360
+    gust = np.fmax(day_peak[:, None, :], day_peak[None, :, :]) * GUST_FACTOR
+    # 0 = wind straight on the nose, 180 = straight from behind
+    true_wind_angle = np.abs((wind_direction - bearing[:, :, None] + 180) % 360 - 180)
+
+    headwind = np.clip(wind_speed * np.cos(np.radians(true_wind_angle)), 0, None)
+    factor = 1 + HEADWIND_PENALTY * headwind
+    factor = factor * np.where(true_wind_angle < NO_GO_ANGLE, TACKING_FACTOR, 1)
+    factor = factor * np.where(wind_speed < MIN_SAILING_WIND_KTS, MOTORING_FACTOR, 1)
+    cost = distance[:, :, None] / boat_speed_kts * factor
+
+    too_short_or_long = (distance < min_leg_nm) | (distance > max_leg_nm) | np.eye(len(names), dtype=bool)
+    blocked = np.isnan(cost) | (gust > gust_limit_kts) | too_short_or_long[:, :, None]
+    cost = np.where(blocked, np.inf, cost)
+    score = np.where(blocked, np.inf, factor)
+    return PassageMatrix(names, list(dates), cost, score, np.broadcast_to(distance[:, :, None], cost.shape), bearing,
+                         wind_speed, wind_direction, true_wind_angle, gust)
+
+
+# Sequence of one leg per date with the lowest total score, optionally from a start and/or to an
+# end position. Scoring by the wind rather than by hours keeps the plan from picking the shortest hop
+# every day. Sailing straight back to the harbour of the day before adds return_penalty.
+# Dynamic programming over (date, previous, current): best[i, j] is the lowest score to be at j
+# after the day, having come from i. Returns the legs as a DataFrame, or None when every
+# sequence needs a blocked leg
+def plan_trip(matrix, start=None, end=None, return_penalty=RETURN_PENALTY):
+    n_positions, _, n_dates = matrix.score.shape
+    if not n_dates or not n_positions:
+        return None
+    start_cost = np.zeros(n_positions)
+    if start is not None:
+        start_cost = np.full(n_positions, np.inf)
+        start_cost[matrix.names.index(start)] = 0
+    back_to_previous = np.eye(n_positions)[:, None, :] * return_penalty
+
+    best = start_cost[:, None] + matrix.score[:, :, 0]
+    came_from = np.zeros((n_dates, n_positions, n_positions), dtype=int)
+    for d in range(1, n_dates):
+        # (previous, current, next), going on to the previous harbour again costs the penalty
+        arriving = best[:, :, None] + back_to_previous
+        came_from[d] = arriving.argmin(axis=0)
+        best = arriving.min(axis=0) + matrix.score[:, :, d]
+
+    if end is not None:
+        last = matrix.names.index(end)
+        previous = int(best[:, last].argmin())
+    else:
+        previous, last = np.unravel_index(int(best.argmin()), best.shape)
+    if not np.isfinite(best[previous, last]):
+        return None
+    path = [last, previous]
+    for d in range(n_dates - 1, 0, -1):
+        path.append(came_from[d, path[-1], path[-2]])
+    path.reverse()
+    return leg_table(matrix, path[:-1], path[1:], range(n_dates))
+
+
+def leg_table(matrix, froms, tos, days):
+    froms, tos, days = np.asarray(froms, dtype=int), np.asarray(tos, dtype=int), np.asarray(days, dtype=int)
+    return pd.DataFrame({
+        'date': [matrix.dates[d] for d in days],
+        'from': [matrix.names[i] for i in froms],
+        'to': [matrix.names[j] for j in tos],
+        'distance_nm': np.round(matrix.distance_nm[froms, tos, days], 1),
+        'bearing_deg': np.round(matrix.bearing_deg[froms, tos]),
+        'wind_speed': np.round(matrix.wind_speed[froms, tos, days], 1),
+        'wind_direction_deg': np.round(matrix.wind_direction_deg[froms, tos, days]),
+        'true_wind_angle': np.round(matrix.true_wind_angle[froms, tos, days]),
+        'gust': np.round(matrix.gust[froms, tos, days], 1),
+        'hours': np.round(matrix.cost[froms, tos, days], 2),
+        'score': np.round(matrix.score[froms, tos, days], 2),
+    })
+
+
+# Every leg that is an option on a date, best score first, to show which legs suit the forecast
+def date_options(matrix, date):
+    d = matrix.dates.index(date)
+    froms, tos = np.nonzero(np.isfinite(matrix.score[:, :, d]))
+    options = leg_table(matrix, froms, tos, np.full(len(froms), d))
+    return options.sort_values(['score', 'hours']).reset_index(drop=True)
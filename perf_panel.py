@@ -0,0 +1,31 @@
+import streamlit as st
+
+from scrape_metrics import metrics
+
+
+# Collapsible panel with the stage timings and outcome counters of this server process,
+# and the cProfile report of `job` when it was profiled
+def show_performance_panel(job=None):
+    with st.expander('Performance'):
+        outcomes = dict(metrics.outcomes)
+        if outcomes:
+            st.write('Outcomes: ' + ', '.join(f'{outcome} {count}' for outcome, count in sorted(outcomes.items())))
+        summary = metrics.summary()
+        if not len(summary):
+            st.write('Nothing measured yet')
+            return
+        st.dataframe(summary)
+
+        stage = st.selectbox('Stage', list(summary['stage']), key='perf_stage')
+        st.bar_chart(metrics.histogram(stage))
+
+        st.download_button('Download summary (JSON)', metrics.to_json(), file_name='scrape_metrics.json',
+                           mime='application/json')
+        st.download_button('Download samples (CSV)', metrics.to_frame().to_csv(index=False),
+                           file_name='scrape_samples.csv', mime='text/csv')
+        if st.button('Reset measurements'):
+            metrics.reset()
+
+        if job is not None and job.profiler is not None:
+            st.subheader(f'Profile of job {job.id}')
+            st.text(job.profiler.report())
@@ -0,0 +1,122 @@
+import argparse
+import datetime
+import json
+import sys
+import time
+
+from scrape_executor import WindQuery, HostRateLimiter
+from forecast_steps import scrape_native_steps
+from forecast_store import ForecastStore
+from forecast_refresh import refresh_plan
+from wind_results import ResultBuffer
+from wind_scraper import STATUS_ERROR, WindReading
+from wind_sources import HttpForecastSource, SeleniumWindSource, FallbackWindSource
+
+DEFAULT_CONFIG = 'prefetch.json'
+DEFAULT_WORKERS = 3
+# minimum seconds between two requests to the same host, as in the apps
+MIN_REQUEST_INTERVAL = 0.5
+
+
+# positions: {name: [lat, lon]}, hours: ['HH:MM', ...] and either days (from today on)
+# or start/end dates. store and format are the defaults of the matching options
+def load_config(path=DEFAULT_CONFIG):
+    with open(path) as f:
+        config = json.load(f)
+    for field in ('positions', 'hours'):
+        if not config.get(field):
+            raise ValueError(f'{path}: {field} is missing or empty')
+    return config
+
+
+def config_dates(config, today=None):
+    if 'start' in config:
+        start = datetime.date.fromisoformat(config['start'])
+        end = datetime.date.fromisoformat(config.get('end', config['start']))
+    else:
+        start = today or datetime.date.today()
+        end = start + datetime.timedelta(days=config.get('days', 1) - 1)
+    return [start + datetime.timedelta(days=d) for d in range((end - start).days + 1)]
+
+
+def config_queries(config, today=None):
+    return [WindQuery(name, lat, lon, date, hour)
+            for date in config_dates(config, today)
+            for hour in config['hours']
+            for name, (lat, lon) in config['positions'].items()]
+
+
+def make_source(backend, workers, lean=False):
+    if backend == 'http':
+        return HttpForecastSource(pool_size=workers)
+    # the driver pool pulls in selenium, only import it when the browser can be needed
+    from driver_pool import DriverPool
+    selenium_source = SeleniumWindSource(DriverPool(size=workers, lean=lean))
+    if backend == 'selenium':
+        return selenium_source
+    return FallbackWindSource(HttpForecastSource(pool_size=workers), selenium_source)
+
+
+def prefetch(queries, source, workers=DEFAULT_WORKERS, min_interval=MIN_REQUEST_INTERVAL, log=print):
+    results = ResultBuffer(len(queries))
+    for query, reading, error in scrape_native_steps(
+            queries, source.fetch_batch, max_workers=workers, rate_limiter=HostRateLimiter(min_interval),
+            host=source.host, group=source.group, fallback=source.fallback):
+        if error is not None:
+            log(f'Failed to get data for {query.name} on {query.date} at {query.hour}: {error}')
+            reading = WindReading(None, None, None, STATUS_ERROR)
+        results.add(query, reading)
+    return results.to_frame()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Fetch the configured forecasts into the forecast store, e.g. from cron: '
+                    '0 */3 * * * cd /path/to/app && python prefetch.py')
+    parser.add_argument('--config', default=DEFAULT_CONFIG, help='JSON file with positions, days and hours')
+    parser.add_argument('--store', help='store directory, default from the config or forecast_store')
+    parser.add_argument('--format', choices=['csv', 'parquet'], help='store file format, default from the config')
+    parser.add_argument('--days', type=int, help='override the number of days from today')
+    parser.add_argument('--backend', choices=['auto', 'http', 'selenium'], default='selenium',
+                        help='auto reads the forecast endpoint and falls back to the browser, '
+                             'not the default until the endpoint is confirmed')
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS)
+    parser.add_argument('--lean', action='store_true', help='start Firefox with the lean scraping profile')
+    parser.add_argument('--min-interval', type=float, default=MIN_REQUEST_INTERVAL)
+    parser.add_argument('--incremental', action='store_true',
+                        help='only fetch what is missing from the store or stale for its lead time')
+    parser.add_argument('--export', help='also write this run as one flat CSV, e.g. wind_data.csv for scratch.py')
+    args = parser.parse_args(argv)
+
+    config = load_config(args.config)
+    if args.days is not None:
+        config = dict(config, days=args.days)
+        config.pop('start', None)
+    store = ForecastStore(args.store or config.get('store', 'forecast_store'),
+                          args.format or config.get('format', 'csv'))
+    queries = config_queries(config)
+    if args.incremental:
+        planned = len(queries)
+        queries = refresh_plan(queries, store.fetched_at)
+        print(f'{len(queries)} of {planned} forecasts are missing or stale')
+        if not queries:
+            return 0
+
+    source = make_source(args.backend, args.workers, args.lean)
+    started = time.time()
+    try:
+        output = prefetch(queries, source, args.workers, args.min_interval)
+    finally:
+        source.close()
+    written = store.write(output, fetched_at=started)
+    if args.export:
+        output.to_csv(args.export, index=False)
+
+    print(f'{written}/{len(queries)} forecasts written to {store.root} '
+          f'({output["status"].value_counts().to_dict()}) in {time.time() - started:.1f}s')
+    # non-zero for cron when nothing at all could be fetched
+    return 0 if written else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,59 @@
+import numpy as np
+import pandas as pd
+
+from route_profile import distance_nm
+from scrape_executor import WindQuery
+
+# Positions closer than this get the same forecast, scrape them once
+MERGE_DISTANCE_NM = 0.5
+
+
+# Map every position name to the name of the position scraped on its behalf: the first
+# position (in dict order) within merge_distance_nm of it, or itself when there is none
+def merge_positions(positions, merge_distance_nm=MERGE_DISTANCE_NM):
+    names = list(positions)
+    coords = np.array([positions[name] for name in names], dtype=float).reshape(-1, 2)
+    close = distance_nm(coords[:, None, 0], coords[:, None, 1], coords[None, :, 0], coords[None, :, 1]) \
+        < merge_distance_nm
+    aliases = {}
+    representatives = []
+    for i, name in enumerate(names):
+        representative = next((r for r in representatives if close[i, r]), None)
+        if representative is None:
+            representatives.append(i)
+            representative = i
+        aliases[name] = names[representative]
+    return aliases
+
+
+# The minimal set of queries the saved routes need: the departure position of every
+# route on the route's own date, for each selected hour. Returns (queries, aliases)
+def plan_route_queries(routes, positions, hours, merge_distance_nm=MERGE_DISTANCE_NM):
+    aliases = merge_positions(positions, merge_distance_nm)
+    planned = {}
+    for route in routes:
+        if route['from'] not in positions:
+            # the position was removed after the route was saved
+            continue
+        representative = aliases[route['from']]
+        lat, lon = positions[representative]
+        for hour in hours:
+            key = (representative, route['date'], hour)
+            if key not in planned:
+                planned[key] = WindQuery(representative, lat, lon, route['date'], hour)
+    return list(planned.values()), aliases
+
+
+# Give every aliased position a copy of the rows scraped for its representative
+def expand_aliases(output, aliases, name_column='pos'):
+    copies = []
+    for name, representative in aliases.items():
+        if name != representative:
+            rows = output[output[name_column] == representative].copy()
+            rows[name_column] = name
+            copies.append(rows)
+    if not copies:
+        return output
+    expanded = pd.concat([output.astype({name_column: str})] + [c.astype({name_column: str}) for c in copies],
+                         ignore_index=True)
+    return expanded.astype({name_column: 'category'})
@@ -0,0 +1,157 @@
+import argparse
+import datetime
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from wind_sources import compass_point, FORECAST_TIME_FIELD, FORECAST_SPEED_FIELD, FORECAST_DIRECTION_FIELD
+
+# time steps of the synthetic forecast series
+SYNTHETIC_STEP_HOURS = 3
+SYNTHETIC_DAYS = 10
+
+
+def recording_key(lat, lon, date, hour):
+    return f'{float(lat):.4f},{float(lon):.4f},{date},{hour}'
+
+
+# A stable made-up reading for points that were never recorded
+def synthetic_reading(lat, lon, date, hour):
+    digest = hashlib.sha1(recording_key(lat, lon, date, hour).encode()).digest()
+    direction_deg = int.from_bytes(digest[:2], 'big') % 360
+    return {'speed': digest[2] % 30, 'direction': compass_point(direction_deg), 'direction_deg': direction_deg}
+
+
+def fixture_name(lat, lon):
+    return f'forecast_{float(lat):.4f}_{float(lon):.4f}.json'
+
+
+# A made-up forecast series in the shape of the forecast endpoint, built from synthetic_reading
+def synthetic_forecast(lat, lon, start=None):
+    start = start or datetime.datetime.now(datetime.timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    steps = []
+    for n in range(SYNTHETIC_DAYS * 24 // SYNTHETIC_STEP_HOURS):
+        moment = start + datetime.timedelta(hours=n * SYNTHETIC_STEP_HOURS)
+        reading = synthetic_reading(lat, lon, moment.date(), moment.strftime('%H:%M'))
+        steps.append({
+            FORECAST_TIME_FIELD: moment.strftime('%Y-%m-%dT%H:%M:%SZ'),
+            FORECAST_SPEED_FIELD: reading['speed'],
+            FORECAST_DIRECTION_FIELD: reading['direction_deg'],
+        })
+    return steps
+
+
+# Recorded readings: a JSON object of recording_key -> {speed, direction, direction_deg}
+def load_recording(path):
+    if path is None:
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_recording(path, rows):
+    # rows of (lat, lon, date, hour, WindReading)
+    recording = {recording_key(lat, lon, date, hour): {'speed': reading.speed, 'direction': reading.direction,
+                                                      'direction_deg': reading.direction_deg}
+                 for lat, lon, date, hour, reading in rows}
+    with open(path, 'w') as f:
+        json.dump(recording, f, indent=1)
+
+
+class ReplayHandler(BaseHTTPRequestHandler):
+    # GET /wind?date=2024-06-01&hour=09:00&points=38.78,20.73;38.62,20.77
+    # answers {"readings": [{"speed": .., "direction": .., "direction_deg": ..}, ...]}, the map scrape stand-in.
+    # GET /forecast?lat=38.78&lon=20.73 answers the captured forecast fixture of that point,
+    # the forecast endpoint stand-in. Both wait the configured latency first
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        url = urllib.parse.urlsplit(self.path)
+        params = urllib.parse.parse_qs(url.query)
+        try:
+            if url.path == '/wind':
+                body = self.wind(params)
+            elif url.path == '/forecast':
+                body = self.forecast(params)
+            else:
+                self.send_error(404)
+                return
+        except (KeyError, ValueError):
+            self.send_error(400)
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def wait(self, points):
+        server = self.server
+        time.sleep(server.latency + random.uniform(0, server.jitter) + server.point_latency * points)
+
+    def wind(self, params):
+        date = params['date'][0]
+        hour = params['hour'][0]
+        points = [tuple(float(v) for v in point.split(',')) for point in params['points'][0].split(';')]
+        self.wait(len(points))
+        readings = []
+        for lat, lon in points:
+            reading = self.server.recording.get(recording_key(lat, lon, date, hour))
+            readings.append(reading if reading is not None else synthetic_reading(lat, lon, date, hour))
+        return json.dumps({'readings': readings}).encode()
+
+    def forecast(self, params):
+        lat = float(params['lat'][0])
+        lon = float(params['lon'][0])
+        self.wait(1)
+        fixtures = self.server.fixtures
+        if fixtures is not None and os.path.exists(os.path.join(fixtures, fixture_name(lat, lon))):
+            with open(os.path.join(fixtures, fixture_name(lat, lon)), 'rb') as f:
+                return f.read()
+        return json.dumps(synthetic_forecast(lat, lon)).encode()
+
+    def log_message(self, format, *args):
+        pass
+
+
+# Start the stand-in on a background thread, port 0 picks a free port. Returns the server,
+# its base URL is f'http://127.0.0.1:{server.server_port}'
+def start_replay_server(recording=None, latency=0.5, jitter=0.0, point_latency=0.0, port=0, fixtures=None):
+    server = ThreadingHTTPServer(('127.0.0.1', port), ReplayHandler)
+    server.daemon_threads = True
+    server.recording = recording or {}
+    server.fixtures = fixtures
+    server.latency = latency
+    server.jitter = jitter
+    server.point_latency = point_latency
+    threading.Thread(target=server.serve_forever, name='replay-server', daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve recorded wind readings with a configurable latency')
+    parser.add_argument('--recording', help='JSON file written by save_recording')
+    parser.add_argument('--fixtures', help='directory of captured forecast JSON, one forecast_<lat>_<lon>.json per point')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0.5, help='seconds added to every request')
+    parser.add_argument('--jitter', type=float, default=0.0, help='up to this many random extra seconds')
+    parser.add_argument('--point-latency', type=float, default=0.0, help='extra seconds per point in a request')
+    args = parser.parse_args()
+
+    server = start_replay_server(load_recording(args.recording), args.latency, args.jitter, args.point_latency,
+                                 args.port, args.fixtures)
+    print(f'Serving wind readings on http://127.0.0.1:{server.server_port}')
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,160 @@
+import datetime
+
+import numpy as np
+import pandas as pd
+
+from forecast_steps import FORECAST_STEP_HOURS
+from scrape_executor import WindQuery
+
+EARTH_RADIUS_NM = 3440.065
+# spacing in degrees of the forecast model grid the route samples are interpolated from
+GRID_RESOLUTION = 0.05
+DEFAULT_SPACING_NM = 1.0
+DEFAULT_BOAT_SPEED_KTS = 6.0
+
+
+def distance_nm(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(v, dtype=float)) for v in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_NM * np.arcsin(np.sqrt(a))
+
+
+def departure_time(date, hour):
+    return datetime.datetime.combine(pd.Timestamp(str(date)).date(), datetime.time.fromisoformat(hour))
+
+
+# Sample every leg every `spacing_nm` along the straight line from -> to, with the time the boat
+# passes each sample at `boat_speed_kts`. legs is a DataFrame with from_lat, from_lon, to_lat,
+# to_lon and departure (datetime) columns; returns one row per sample with the leg's row label
+def sample_legs(legs, spacing_nm=DEFAULT_SPACING_NM, boat_speed_kts=DEFAULT_BOAT_SPEED_KTS):
+    lengths = distance_nm(legs['from_lat'], legs['from_lon'], legs['to_lat'], legs['to_lon'])
+    counts = np.maximum(np.ceil(lengths / spacing_nm).astype(int), 1) + 1
+    leg = np.repeat(np.arange(len(legs)), counts)
+    # fraction of the leg covered at every sample, 0 at the start and 1 at the end
+    starts = np.repeat(np.cumsum(counts) - counts, counts)
+    fraction = (np.arange(counts.sum()) - starts) / np.repeat(counts - 1, counts)
+
+    from_lat = legs['from_lat'].to_numpy(dtype=float)[leg]
+    from_lon = legs['from_lon'].to_numpy(dtype=float)[leg]
+    to_lat = legs['to_lat'].to_numpy(dtype=float)[leg]
+    to_lon = legs['to_lon'].to_numpy(dtype=float)[leg]
+    along = fraction * lengths[leg]
+    departure = pd.to_datetime(legs['departure']).to_numpy()[leg]
+    return pd.DataFrame({
+        'leg': legs.index.to_numpy()[leg],
+        'distance_nm': along,
+        'lat': from_lat + fraction * (to_lat - from_lat),
+        'lon': from_lon + fraction * (to_lon - from_lon),
+        'time': departure + (along / boat_speed_kts * 3600).astype('timedelta64[s]'),
+    })
+
+
+# Grid cell corners and forecast steps around every sample, with their interpolation weights.
+# Corners with zero weight are dropped so an exact grid point or step needs no neighbour
+def _corners(lats, lons, times, resolution, step_hours):
+    y = np.asarray(lats, dtype=float) / resolution
+    x = np.asarray(lons, dtype=float) / resolution
+    t = (pd.to_datetime(times).to_numpy().astype('datetime64[s]').astype(np.int64) / 3600) / step_hours
+    i0, j0, k0 = np.floor(y).astype(np.int64), np.floor(x).astype(np.int64), np.floor(t).astype(np.int64)
+    fy, fx, ft = y - i0, x - j0, t - k0
+
+    corners = []
+    for di in (0, 1):
+        for dj in (0, 1):
+            for dk in (0, 1):
+                weight = (fy if di else 1 - fy) * (fx if dj else 1 - fx) * (ft if dk else 1 - ft)
+                corners.append((i0 + di, j0 + dj, k0 + dk, weight))
+    return corners
+
+
+# The grid nodes and model steps the samples need, as queries to scrape
+def anchor_queries(samples, resolution=GRID_RESOLUTION, step_hours=FORECAST_STEP_HOURS):
+    needed = set()
+    for i, j, k, weight in _corners(samples['lat'], samples['lon'], samples['time'], resolution, step_hours):
+        used = weight > 1e-9
+        needed.update(zip(i[used].tolist(), j[used].tolist(), k[used].tolist()))
+
+    queries = []
+    for i, j, k in sorted(needed):
+        lat, lon = round(i * resolution, 4), round(j * resolution, 4)
+        moment = datetime.datetime(1970, 1, 1) + datetime.timedelta(hours=k * step_hours)
+        queries.append(WindQuery(anchor_name(lat, lon), lat, lon, moment.date(), moment.strftime('%H:%M')))
+    return queries
+
+
+def anchor_name(lat, lon):
+    return f'grid:{lat:.4f},{lon:.4f}'
+
+
+# The rows of output that lie on a grid node at a model step, with their node and step indices.
+# Anything else, e.g. a harbour position or an hour between steps, is not an anchor
+def grid_rows(output, resolution=GRID_RESOLUTION, step_hours=FORECAST_STEP_HOURS):
+    y = output['lat'].to_numpy(dtype=float) / resolution
+    x = output['lon'].to_numpy(dtype=float) / resolution
+    when = pd.to_datetime(output['date'].astype(str) + ' ' + output['hour'].astype(str))
+    t = (when.to_numpy().astype('datetime64[s]').astype(np.int64) / 3600) / step_hours
+    on_grid = np.isclose(y, np.round(y), rtol=0, atol=1e-6) & np.isclose(x, np.round(x), rtol=0, atol=1e-6) & \
+        np.isclose(t, np.round(t), rtol=0, atol=1e-6)
+    rows = output[on_grid].copy()
+    rows['i'] = np.round(y[on_grid]).astype(np.int64)
+    rows['j'] = np.round(x[on_grid]).astype(np.int64)
+    rows['k'] = np.round(t[on_grid]).astype(np.int64)
+    return rows
+
+
+# Interpolate wind at every sample from scraped grid anchors: bilinear in space, linear in time.
+# Speed is interpolated as a scalar and direction through its unit vector so 350 and 10 average
+# to 0, not 180. Only rows on a grid node count (see grid_rows), missing anchors are left out and
+# the remaining weights renormalised
+def interpolate_wind(samples, output, resolution=GRID_RESOLUTION, step_hours=FORECAST_STEP_HOURS):
+    known = grid_rows(output.dropna(subset=['speed', 'direction_deg']), resolution, step_hours)
+    radians = np.radians(known['direction_deg'].to_numpy(dtype=float))
+    table = pd.DataFrame({
+        'speed': known['speed'].to_numpy(dtype=float),
+        'sin': np.sin(radians),
+        'cos': np.cos(radians),
+    }, index=pd.MultiIndex.from_arrays([known['i'].to_numpy(), known['j'].to_numpy(), known['k'].to_numpy()]))
+    table = table[~table.index.duplicated(keep='last')]
+
+    total = np.zeros((len(samples), 3))
+    weights = np.zeros(len(samples))
+    for i, j, k, weight in _corners(samples['lat'], samples['lon'], samples['time'], resolution, step_hours):
+        values = table.reindex(pd.MultiIndex.from_arrays([i, j, k])).to_numpy()
+        found = ~np.isnan(values[:, 0]) & (weight > 0)
+        total[found] += weight[found, None] * values[found]
+        weights[found] += weight[found]
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        speed, sin, cos = (total / weights[:, None]).T
+    profile = samples.copy()
+    profile['speed'] = np.round(speed, 1)
+    profile['direction_deg'] = np.round(np.degrees(np.arctan2(sin, cos)) % 360)
+    return profile
+
+
+# Legs of the saved routes, each leaving at departure_hour on the route's date
+def route_legs(routes, positions, departure_hour):
+    rows = []
+    for n, route in enumerate(routes):
+        if route['from'] not in positions or route['to'] not in positions:
+            continue
+        rows.append({
+            'route': n,
+            'date': route['date'],
+            'from': route['from'],
+            'to': route['to'],
+            'from_lat': positions[route['from']][0],
+            'from_lon': positions[route['from']][1],
+            'to_lat': positions[route['to']][0],
+            'to_lon': positions[route['to']][1],
+            'departure': departure_time(route['date'], departure_hour),
+        })
+    return pd.DataFrame(rows, columns=['route', 'date', 'from', 'to', 'from_lat', 'from_lon', 'to_lat', 'to_lon',
+                                       'departure'])
+
+
+# Wind along every leg: samples joined with their leg and interpolated wind
+def route_profile(legs, output, spacing_nm=DEFAULT_SPACING_NM, boat_speed_kts=DEFAULT_BOAT_SPEED_KTS):
+    samples = sample_legs(legs, spacing_nm, boat_speed_kts)
+    profile = interpolate_wind(samples, output)
+    return legs[['route', 'from', 'to']].join(profile.set_index('leg'), how='inner').reset_index(drop=True)
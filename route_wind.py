@@ -0,0 +1,34 @@
+# wind_status of a route hour that has no scraped forecast
+STATUS_MISSING = 'missing'
+
+
+# Results indexed by (pos, date, hour), one row per key
+def forecast_table(output, name_column='pos'):
+    table = output.astype({name_column: str}).set_index([name_column, 'date', 'hour'])
+    table = table[~table.index.duplicated(keep='last')]
+    return table[['speed', 'direction', 'direction_deg', 'status']].sort_index()
+
+
+# One row per route and hour with the forecast at the route's departure position,
+# joined on (from, date, hour) in one indexed merge.
+# Hours without a forecast keep the route row with empty wind and wind_status 'missing'
+def enrich_routes(route_df, output, hours, name_column='pos'):
+    table = forecast_table(output, name_column).rename(columns={
+        'speed': 'wind_speed',
+        'direction': 'wind_direction',
+        'direction_deg': 'wind_direction_deg',
+        'status': 'wind_status',
+    })
+    legs = route_df.drop(columns=['wind_speed', 'wind_direction', 'wind_direction_deg', 'wind_status'],
+                         errors='ignore')
+    legs = legs.assign(route=range(len(legs)), hour=[list(hours)] * len(legs)).explode('hour')
+    enriched = legs.join(table, on=['from', 'date', 'hour'])
+    enriched['wind_status'] = enriched['wind_status'].astype(object).fillna(STATUS_MISSING)
+    return enriched.reset_index(drop=True)
+
+
+# The earliest hour with a wind reading for every route, for drawing one arrow per route.
+# Hours that timed out or failed have a status but no speed and are skipped like missing ones
+def departure_wind(enriched):
+    found = enriched[enriched['wind_speed'].notna()]
+    return found.sort_values(['route', 'hour']).drop_duplicates('route')
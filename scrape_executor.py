@@ -0,0 +1,111 @@
+import threading
+import time
+from collections import defaultdict, namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from scrape_metrics import metrics, STAGE_CACHE_LOOKUP, STAGE_FETCH
+from wind_scraper import WINDFINDER_HOST, STATUS_OK, STATUS_ERROR, viewport_groups
+
+# One cell of the position x date x hour grid
+WindQuery = namedtuple('WindQuery', ['name', 'lat', 'lon', 'date', 'hour'])
+
+
+class HostRateLimiter:
+    # Spaces out request starts to the same host by at least `min_interval` seconds,
+    # no matter how many workers are asking
+
+    def __init__(self, min_interval=0.5):
+        self.min_interval = min_interval
+        self._next_slot = {}
+        self._lock = threading.Lock()
+
+    def wait(self, host):
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next_slot.get(host, now))
+            self._next_slot[host] = start + self.min_interval
+        if start > now:
+            time.sleep(start - now)
+
+
+# Split queries into batches that can be read from one page load: same date and hour,
+# positions inside one map viewport
+def group_by_viewport(queries):
+    by_time = defaultdict(list)
+    for query in queries:
+        by_time[(query.date, query.hour)].append(query)
+    batches = []
+    for same_time in by_time.values():
+        for _, _, clicks in viewport_groups([(q.lat, q.lon) for q in same_time]):
+            batches.append([same_time[index] for index, _, _ in clicks])
+    return batches
+
+
+# Run fetch on a bounded worker pool and yield (query, result, error) for every query
+# as results finish, not in submission order.
+# fetch takes one query, or with `group` a batch of queries and returns one result per query.
+# Queries found in the cache are answered without touching a browser.
+# With a `fallback` WindSource, every query fetch did not answer OK is collected once all batches
+# are in, regrouped with fallback.group and fetched with fallback.fetch_batch, rate limited on
+# fallback.host instead of `host`.
+# Every query's outcome (its reading status, or 'error') is counted in scrape_metrics.metrics
+def scrape_grid(queries, fetch, max_workers=3, rate_limiter=None, host=WINDFINDER_HOST, cache=None, group=None,
+                fallback=None):
+    hits = []
+    misses = []
+    for query in queries:
+        reading = None
+        if cache is not None:
+            with metrics.stage(STAGE_CACHE_LOOKUP):
+                reading = cache.get(query.lat, query.lon, query.date, query.hour)
+        if reading is None:
+            misses.append(query)
+        else:
+            hits.append((query, reading))
+
+    def run(batch, fetch, host, group):
+        if rate_limiter is not None:
+            rate_limiter.wait(host)
+        with metrics.stage(STAGE_FETCH):
+            if group is None:
+                return [fetch(batch[0])]
+            return fetch(batch)
+
+    rounds = [(fetch, host, group)]
+    if fallback is not None:
+        rounds.append((fallback.fetch_batch, fallback.host, fallback.group))
+    executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='scrape')
+    try:
+        pending = misses
+        for n, (fetch, host, group) in enumerate(rounds):
+            retry = [] if n < len(rounds) - 1 else None
+            batches = [[query] for query in pending] if group is None else group(pending)
+            futures = {executor.submit(run, batch, fetch, host, group): batch for batch in batches}
+            if n == 0:
+                for query, reading in hits:
+                    metrics.count(reading.status)
+                    yield query, reading, None
+            for future in as_completed(futures):
+                batch = futures[future]
+                try:
+                    results = future.result()
+                except Exception as e:
+                    if retry is not None:
+                        retry.extend(batch)
+                        continue
+                    metrics.count(STATUS_ERROR, len(batch))
+                    for query in batch:
+                        yield query, None, e
+                    continue
+                for query, result in zip(batch, results):
+                    if retry is not None and result.status != STATUS_OK:
+                        retry.append(query)
+                        continue
+                    metrics.count(result.status)
+                    if cache is not None and result.status == STATUS_OK:
+                        cache.put(query.lat, query.lon, query.date, query.hour, result)
+                    yield query, result, None
+            pending = retry
+    finally:
+        # a rerun can abandon the loop half way, do not start the queries that are left
+        executor.shutdown(wait=False, cancel_futures=True)
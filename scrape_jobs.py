@@ -0,0 +1,149 @@
+import queue
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from scrape_executor import scrape_grid
+from scrape_metrics import FetchProfiler
+from wind_results import ResultBuffer
+from wind_scraper import WindReading, STATUS_ERROR
+
+# Job states
+JOB_QUEUED = 'queued'
+JOB_RUNNING = 'running'
+JOB_DONE = 'done'
+JOB_CANCELLED = 'cancelled'
+JOB_FAILED = 'failed'
+
+
+class ScrapeJob:
+    # One scrape of a query list. Results are stored as they arrive so a page can show
+    # partial results while the job is still running
+
+    def __init__(self, queries, fetch, scrape, scrape_kwargs, profile=False):
+        self.id = uuid.uuid4().hex[:8]
+        self.queries = list(queries)
+        # with profile, every fetch runs under cProfile and job.profiler.report() tells where it went
+        self.profiler = FetchProfiler() if profile else None
+        self.fetch = self._counted(fetch if self.profiler is None else self.profiler.wrap(fetch))
+        # queries handed to fetch, what the job actually scraped rather than took from a cache or interpolated
+        self.fetched = 0
+        self.scrape = scrape
+        self.scrape_kwargs = scrape_kwargs
+        self.state = JOB_QUEUED
+        self.message = 'Waiting for a free worker'
+        self.error = None
+        self.done = 0
+        self.submitted_at = time.time()
+        self.finished_at = None
+        self._results = ResultBuffer(len(self.queries))
+        self._cancel = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def total(self):
+        return len(self.queries)
+
+    @property
+    def finished(self):
+        return self.state in (JOB_DONE, JOB_CANCELLED, JOB_FAILED)
+
+    def progress(self):
+        return min(1.0, self.done / self.total) if self.total else 1.0
+
+    def cancel(self):
+        self._cancel.set()
+        if self.state == JOB_QUEUED:
+            self._finish(JOB_CANCELLED, 'Cancelled before it started')
+
+    # fetch is called with one batch of queries, or with a single query when scrape_grid has no group
+    def _counted(self, fetch):
+        def counted(batch, *args, **kwargs):
+            with self._lock:
+                self.fetched += len(batch) if isinstance(batch, list) else 1
+            return fetch(batch, *args, **kwargs)
+        return counted
+
+    def to_frame(self, name_column='name'):
+        with self._lock:
+            return self._results.to_frame(name_column)
+
+    def _finish(self, state, message):
+        self.state = state
+        self.message = message
+        self.finished_at = time.time()
+
+    def run(self):
+        if self._cancel.is_set():
+            return
+        self.state = JOB_RUNNING
+        results = self.scrape(self.queries, self.fetch, **self.scrape_kwargs)
+        try:
+            for query, data, error in results:
+                if error is not None:
+                    self.message = f'Failed to get data for {query.name} on {query.date} at {query.hour}: {error}'
+                    data = WindReading(None, None, None, STATUS_ERROR)
+                else:
+                    self.message = f'{data.status}: {query.name} on {query.date} at {query.hour}'
+                with self._lock:
+                    self._results.add(query, data)
+                    self.done += 1
+                if self._cancel.is_set():
+                    self._finish(JOB_CANCELLED, f'Cancelled after {self.done} of {self.total} queries')
+                    return
+            self._finish(JOB_DONE, f'Finished {self.total} queries')
+        except Exception as e:
+            self.error = e
+            self._finish(JOB_FAILED, f'Job failed: {e}')
+        finally:
+            # stops the queries that have not started yet
+            results.close()
+
+
+class JobQueue:
+    # Process-wide queue of scrape jobs run by `workers` background threads,
+    # so a scrape outlives the Streamlit script run that submitted it
+
+    def __init__(self, workers=1, keep_finished=20):
+        self.keep_finished = keep_finished
+        self._jobs = OrderedDict()
+        self._pending = queue.Queue()
+        self._lock = threading.Lock()
+        for n in range(workers):
+            threading.Thread(target=self._work, name=f'scrape-job-{n}', daemon=True).start()
+
+    # scrape is scrape_grid or a function with the same signature, e.g. scrape_native_steps
+    def submit(self, queries, fetch, scrape=scrape_grid, profile=False, **scrape_kwargs):
+        job = ScrapeJob(queries, fetch, scrape, scrape_kwargs, profile)
+        with self._lock:
+            self._jobs[job.id] = job
+            self._prune()
+        self._pending.put(job)
+        return job.id
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id):
+        job = self.get(job_id)
+        if job is not None:
+            job.cancel()
+
+    def jobs(self):
+        with self._lock:
+            return list(self._jobs.values())
+
+    def _prune(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job.finished]
+        for job_id in finished[:max(0, len(finished) - self.keep_finished)]:
+            del self._jobs[job_id]
+
+    def _work(self):
+        while True:
+            job = self._pending.get()
+            try:
+                job.run()
+            finally:
+                self._pending.task_done()
@@ -0,0 +1,165 @@
+import cProfile
+import io
+import json
+import pstats
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+# Stages timed along a query, in the order they happen
+STAGE_DRIVER_INSTALL = 'driver_install'
+STAGE_DRIVER_LAUNCH = 'driver_launch'
+STAGE_CACHE_LOOKUP = 'cache_lookup'
+STAGE_FETCH = 'fetch'
+STAGE_HTTP_REQUEST = 'http_request'
+STAGE_HTTP_PARSE = 'http_parse'
+STAGE_PAGE_LOAD = 'page_load'
+STAGE_CLICK = 'click'
+STAGE_TOOLTIP_WAIT = 'tooltip_wait'
+STAGE_TOOLTIP_SCRIPT = 'tooltip_script'
+STAGE_PARSE = 'parse'
+STAGES = [STAGE_DRIVER_INSTALL, STAGE_DRIVER_LAUNCH, STAGE_CACHE_LOOKUP, STAGE_FETCH, STAGE_HTTP_REQUEST,
+          STAGE_HTTP_PARSE, STAGE_PAGE_LOAD, STAGE_CLICK, STAGE_TOOLTIP_WAIT, STAGE_TOOLTIP_SCRIPT, STAGE_PARSE]
+
+# Outcome counted when a driver had to be thrown away after an exception
+OUTCOME_DRIVER_CRASH = 'driver_crash'
+# and when it was recycled for using too much memory
+OUTCOME_DRIVER_MEMORY = 'driver_memory_recycle'
+
+
+class ScrapeMetrics:
+    # Per-stage durations and outcome counters of every query in the process.
+    # The most recent `window` durations of each stage are kept for percentiles and histograms,
+    # count and total time cover everything since the last reset
+
+    def __init__(self, window=5000):
+        self.window = window
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._samples = {}
+            self._totals = Counter()
+            self._counts = Counter()
+            self.outcomes = Counter()
+            self.started_at = time.time()
+
+    def add(self, stage, seconds):
+        with self._lock:
+            if stage not in self._samples:
+                self._samples[stage] = deque(maxlen=self.window)
+            self._samples[stage].append((time.time(), seconds))
+            self._totals[stage] += seconds
+            self._counts[stage] += 1
+
+    # Time the body of a with block as one sample of `stage`, also when it raises
+    @contextmanager
+    def stage(self, stage):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, time.perf_counter() - started)
+
+    def count(self, outcome, n=1):
+        with self._lock:
+            self.outcomes[outcome] += n
+
+    def durations(self, stage):
+        with self._lock:
+            return np.array([seconds for _, seconds in self._samples.get(stage, ())])
+
+    def summary(self):
+        with self._lock:
+            stages = [stage for stage in STAGES if stage in self._samples] + \
+                     sorted(stage for stage in self._samples if stage not in STAGES)
+            rows = []
+            for stage in stages:
+                recent = np.array([seconds for _, seconds in self._samples[stage]])
+                rows.append({
+                    'stage': stage,
+                    'count': self._counts[stage],
+                    'total_s': round(self._totals[stage], 3),
+                    'mean_s': round(self._totals[stage] / self._counts[stage], 4),
+                    'p50_s': round(float(np.percentile(recent, 50)), 4),
+                    'p95_s': round(float(np.percentile(recent, 95)), 4),
+                    'max_s': round(float(recent.max()), 4),
+                })
+        return pd.DataFrame(rows, columns=['stage', 'count', 'total_s', 'mean_s', 'p50_s', 'p95_s', 'max_s'])
+
+    # One row per kept sample, for CSV export
+    def to_frame(self):
+        with self._lock:
+            rows = [(stage, at, seconds) for stage, samples in self._samples.items() for at, seconds in samples]
+        frame = pd.DataFrame(rows, columns=['stage', 'at', 'seconds'])
+        frame['at'] = pd.to_datetime(frame['at'], unit='s')
+        return frame.sort_values('at').reset_index(drop=True)
+
+    def to_json(self):
+        with self._lock:
+            outcomes = dict(self.outcomes)
+        return json.dumps({
+            'since': self.started_at,
+            'outcomes': outcomes,
+            'stages': self.summary().to_dict(orient='records'),
+        }, indent=1)
+
+    # Counts of `stage` durations in `bins` equal bins, as a DataFrame indexed by the bin's upper edge
+    def histogram(self, stage, bins=20):
+        durations = self.durations(stage)
+        if not len(durations):
+            return pd.DataFrame({'queries': []})
+        counts, edges = np.histogram(durations, bins=bins)
+        return pd.DataFrame({'queries': counts}, index=pd.Index(np.round(edges[1:], 3), name='seconds'))
+
+
+# Shared by every worker of the process, like the page load latencies
+metrics = ScrapeMetrics()
+
+
+class FetchProfiler:
+    # cProfile for one scrape. cProfile only follows the thread that enables it, so every fetch
+    # call is profiled in its worker thread and the results are merged
+
+    def __init__(self):
+        self._profiles = []
+        self._lock = threading.Lock()
+
+    def wrap(self, fetch):
+        def profiled(*args, **kwargs):
+            profile = cProfile.Profile()
+            try:
+                return profile.runcall(fetch, *args, **kwargs)
+            finally:
+                with self._lock:
+                    self._profiles.append(profile)
+        return profiled
+
+    def stats(self):
+        with self._lock:
+            profiles = list(self._profiles)
+        if not profiles:
+            return None
+        stats = pstats.Stats(profiles[0], stream=io.StringIO())
+        for profile in profiles[1:]:
+            stats.add(profile)
+        return stats
+
+    def report(self, sort='cumulative', limit=30):
+        stats = self.stats()
+        if stats is None:
+            return 'No fetch was profiled'
+        stream = io.StringIO()
+        stats.stream = stream
+        stats.sort_stats(sort).print_stats(limit)
+        return stream.getvalue()
+
+    def dump(self, path):
+        stats = self.stats()
+        if stats is not None:
+            stats.dump_stats(path)
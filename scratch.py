@@ -1,7 +1,31 @@
 # This file recevis a data frame and a route and plots the wind along the route
 import pandas as pd
 
+import sys
+
+from route_profile import route_profile, departure_time, sample_legs, anchor_queries, grid_rows
 
 df = pd.read_csv('wind_data.csv')
 
-route = pd.DataFrame(columns = 'day' ,'')
\ No newline at end of file
+route = pd.DataFrame([{
+    'route': 0,
+    'from': 'lefkada_canal',
+    'to': 'meganisi',
+    'from_lat': 38.7825,
+    'from_lon': 20.7322,
+    'to_lat': 38.623,
+    'to_lon': 20.7707,
+    'departure': departure_time(df['date'].min(), '09:00'),
+}])
+
+# The profile is interpolated from grid nodes only. wind_data.csv from prefetch.py --export holds the
+# harbours, snapping those onto the nearest nodes would make up the wind in between
+if grid_rows(df.dropna(subset=['speed', 'direction_deg'])).empty:
+    anchors = anchor_queries(sample_legs(route, spacing_nm=1.0, boat_speed_kts=6.0))
+    print(f'wind_data.csv has no forecasts on grid nodes, the route needs these {len(anchors)}:')
+    for anchor in anchors:
+        print(f'  {anchor.lat} {anchor.lon} {anchor.date} {anchor.hour}')
+    sys.exit(1)
+
+profile = route_profile(route, df, spacing_nm=1.0, boat_speed_kts=6.0)
+print(profile)
@@ -0,0 +1,45 @@
+import datetime
+import time
+
+from forecast_cache import ForecastCache
+from forecast_refresh import refresh_plan
+from scrape_executor import WindQuery
+from wind_scraper import WindReading, STATUS_OK
+
+READING = WindReading(12, 'NW', 315, STATUS_OK)
+
+
+def utc_now():
+    return datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+
+
+def test_cache_keeps_the_fetch_time_past_its_ttl(tmp_path):
+    cache = ForecastCache(str(tmp_path / 'cache.sqlite'), ttl=3 * 3600)
+    far_out = (utc_now() + datetime.timedelta(days=5)).date()
+    cache.put(38.78, 20.73, far_out, '12:00', READING, fetched_at=time.time() - 4 * 3600)
+    # every put evicts, the old entry has to survive the next one
+    cache.put(38.62, 20.77, far_out, '12:00', READING)
+
+    assert cache.get(38.78, 20.73, far_out, '12:00') is None
+    assert cache.fetched_at(38.78, 20.73, far_out, '12:00') is not None
+
+
+def test_far_out_forecasts_stay_fresh_between_refreshes(tmp_path):
+    cache = ForecastCache(str(tmp_path / 'cache.sqlite'), ttl=3 * 3600)
+    far_out = (utc_now() + datetime.timedelta(days=5)).date()
+    query = WindQuery('lefkada_canal', 38.78, 20.73, far_out, '12:00')
+    cache.put(query.lat, query.lon, query.date, query.hour, READING, fetched_at=time.time() - 4 * 3600)
+    cache.put(38.62, 20.77, far_out, '12:00', READING)
+
+    assert refresh_plan([query], cache.fetched_at) == []
+    assert refresh_plan([query], cache.fetched_at, now=time.time() + 9 * 3600) == [query]
+
+
+def test_cache_still_evicts_the_oldest_beyond_max_entries(tmp_path):
+    cache = ForecastCache(str(tmp_path / 'cache.sqlite'), ttl=3 * 3600, max_entries=2)
+    date = datetime.date(2026, 7, 1)
+    for n, hour in enumerate(['09:00', '12:00', '15:00']):
+        cache.put(38.78, 20.73, date, hour, READING, fetched_at=time.time() - (3 - n) * 3600)
+
+    assert cache.fetched_at(38.78, 20.73, date, '09:00') is None
+    assert cache.stats()['entries'] == 2
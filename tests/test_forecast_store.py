@@ -0,0 +1,21 @@
+import datetime
+
+import pandas as pd
+
+from forecast_steps import STATUS_INTERPOLATED
+from forecast_store import ForecastStore, STATUS_PREFETCHED
+from wind_scraper import STATUS_OK
+
+DATE = datetime.date(2026, 7, 1)
+
+
+def test_store_keeps_interpolated_status(tmp_path):
+    store = ForecastStore(str(tmp_path / 'store'))
+    store.write(pd.DataFrame({
+        'name': ['kioni', 'kioni'], 'lat': [38.4473, 38.4473], 'lon': [20.695, 20.695], 'date': [DATE, DATE],
+        'hour': ['12:00', '14:00'], 'speed': [12, 13], 'direction': ['NW', 'NW'], 'direction_deg': [315, 318],
+        'status': [STATUS_OK, STATUS_INTERPOLATED],
+    }))
+
+    assert store.get(38.4473, 20.695, DATE, '12:00').status == STATUS_PREFETCHED
+    assert store.get(38.4473, 20.695, DATE, '14:00').status == STATUS_INTERPOLATED
@@ -0,0 +1,93 @@
+import datetime
+import os
+
+import pytest
+
+from replay_server import start_replay_server
+from scrape_executor import WindQuery, scrape_grid
+from wind_scraper import WindReading, STATUS_OK, STATUS_PARSE_ERROR
+from wind_sources import HttpForecastSource, FallbackWindSource, WindSource
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+DATE = datetime.date(2026, 7, 1)
+LEFKADA = ('lefkada_canal', 38.7825, 20.7322)
+MEGANISI = ('meganisi', 38.623, 20.7707)
+
+
+@pytest.fixture(scope='module')
+def forecast_url():
+    server = start_replay_server(latency=0.0, fixtures=FIXTURES)
+    yield f'http://127.0.0.1:{server.server_port}/forecast'
+    server.shutdown()
+
+
+@pytest.fixture
+def source(forecast_url):
+    source = HttpForecastSource(url=forecast_url, timeout=5.0)
+    yield source
+    source.close()
+
+
+def query(position, hour):
+    return WindQuery(*position, DATE, hour)
+
+
+class RecordingSource(WindSource):
+    # Answers every query with the same reading and remembers the batches it was asked for
+    name = 'recording'
+    host = 'fallback.test'
+
+    def __init__(self):
+        self.batches = []
+
+    def fetch_batch(self, queries):
+        self.batches.append(list(queries))
+        return [WindReading(5, 'N', 0, STATUS_OK)] * len(queries)
+
+
+def test_reads_the_steps_of_a_point(source):
+    readings = source.fetch_batch([query(LEFKADA, '06:00'), query(LEFKADA, '09:00')])
+    assert readings == [WindReading(6, 'N', 350, STATUS_OK), WindReading(12, 'NW', 315, STATUS_OK)]
+
+
+def test_step_times_are_compared_in_utc(source):
+    # the fixture gives 12:00Z as 15:00+03:00
+    assert source.fetch(query(LEFKADA, '12:00')) == WindReading(17, 'WNW', 300, STATUS_OK)
+
+
+def test_missing_and_malformed_steps_are_parse_errors(source):
+    readings = source.fetch_batch([query(LEFKADA, '21:00'), query(LEFKADA, '18:00')])
+    assert [reading.status for reading in readings] == [STATUS_PARSE_ERROR, STATUS_PARSE_ERROR]
+
+
+def test_direction_wraps_to_north(source):
+    assert source.fetch(query(MEGANISI, '12:00')) == WindReading(12, 'N', 0, STATUS_OK)
+
+
+def test_groups_queries_by_point(source):
+    queries = [query(LEFKADA, '09:00'), query(MEGANISI, '09:00'), query(LEFKADA, '15:00')]
+    assert source.group(queries) == [[queries[0], queries[2]], [queries[1]]]
+
+
+def test_fallback_gets_the_failures_of_every_batch_regrouped(source):
+    class Waits:
+        def __init__(self):
+            self.hosts = []
+
+        def wait(self, host):
+            self.hosts.append(host)
+
+    fallback = RecordingSource()
+    combined = FallbackWindSource(source, fallback)
+    queries = [query(LEFKADA, '09:00'), query(LEFKADA, '21:00'), query(MEGANISI, '09:00'),
+               query(MEGANISI, '21:00')]
+    rate_limiter = Waits()
+    results = {q: reading for q, reading, error in scrape_grid(
+        queries, combined.fetch_batch, rate_limiter=rate_limiter, host=combined.host, group=combined.group,
+        fallback=combined.fallback)}
+
+    assert results[queries[0]] == WindReading(12, 'NW', 315, STATUS_OK)
+    assert results[queries[1]] == results[queries[3]] == WindReading(5, 'N', 0, STATUS_OK)
+    # both points failed at 21:00, the fallback gets them as one batch
+    assert [sorted(q.name for q in batch) for batch in fallback.batches] == [['lefkada_canal', 'meganisi']]
+    assert sorted(rate_limiter.hosts) == sorted([source.host, source.host, 'fallback.test'])
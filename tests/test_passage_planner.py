@@ -0,0 +1,55 @@
+import datetime
+import itertools
+
+import numpy as np
+
+from passage_planner import PassageMatrix, passage_matrix, plan_trip, RETURN_PENALTY
+
+DATES = [datetime.date(2026, 7, 1) + datetime.timedelta(days=d) for d in range(4)]
+
+
+def random_matrix(n_positions, n_dates, seed):
+    rng = np.random.default_rng(seed)
+    shape = (n_positions, n_positions, n_dates)
+    score = rng.uniform(1, 3, shape)
+    score[rng.uniform(size=shape) < 0.2] = np.inf
+    score[np.arange(n_positions), np.arange(n_positions)] = np.inf
+    zeros = np.zeros(shape)
+    return PassageMatrix([f'p{i}' for i in range(n_positions)], DATES[:n_dates], score * 2, score, zeros,
+                         zeros[:, :, 0], zeros, zeros, zeros, zeros)
+
+
+def trip_score(matrix, path):
+    total = sum(matrix.score[path[d], path[d + 1], d] for d in range(len(path) - 1))
+    return total + RETURN_PENALTY * sum(path[d + 1] == path[d - 1] for d in range(1, len(path) - 1))
+
+
+def brute_force(matrix, start=None, end=None):
+    n_positions, _, n_dates = matrix.score.shape
+    scores = [trip_score(matrix, path) for path in itertools.product(range(n_positions), repeat=n_dates + 1)
+              if (start is None or path[0] == start) and (end is None or path[-1] == end)]
+    return min(scores)
+
+
+def test_plan_trip_matches_brute_force():
+    for seed in range(30):
+        matrix = random_matrix(4, 3, seed)
+        for start, end in [(None, None), (0, None), (None, 3), (1, 2)]:
+            expected = brute_force(matrix, start, end)
+            plan = plan_trip(matrix, None if start is None else f'p{start}', None if end is None else f'p{end}')
+            if not np.isfinite(expected):
+                assert plan is None
+                continue
+            path = [matrix.names.index(name) for name in plan['from']] + [matrix.names.index(plan['to'].iloc[-1])]
+            assert np.isclose(trip_score(matrix, path), expected)
+
+
+def test_plan_trip_does_not_prefer_the_shortest_hop():
+    # a 3 nm hop straight into a northerly and a longer leg with the same wind from behind
+    positions = {'north_hop': (38.55, 20.70), 'home': (38.50, 20.70), 'south': (38.30, 20.70)}
+    shape = (len(positions), 1, 4)
+    speed, direction_deg = np.full(shape, 15.0), np.zeros(shape)
+
+    plan = plan_trip(passage_matrix(positions, DATES[:1], speed, direction_deg), start='home')
+
+    assert plan['to'].tolist() == ['south']
@@ -0,0 +1,16 @@
+from query_planner import merge_positions
+
+
+def test_merge_positions_by_distance_not_grid_cell():
+    positions = {
+        'filiatru': (38.3744, 20.7442),
+        'vathi': (38.3711, 20.7127),
+        # 100 m apart, on both sides of a 0.05 degree line
+        'north_of_line': (38.5004, 20.70),
+        'south_of_line': (38.4996, 20.70),
+    }
+
+    aliases = merge_positions(positions)
+
+    assert aliases['vathi'] == 'vathi'
+    assert aliases['south_of_line'] == 'north_of_line'
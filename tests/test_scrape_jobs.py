@@ -0,0 +1,25 @@
+import datetime
+import time
+
+from forecast_steps import scrape_native_steps, STATUS_INTERPOLATED
+from scrape_executor import WindQuery
+from scrape_jobs import JobQueue
+from wind_scraper import WindReading, STATUS_OK
+
+DATE = datetime.date(2026, 7, 1)
+
+
+def test_job_counts_the_model_steps_it_fetched():
+    def fetch(batch):
+        return [WindReading(12, 'NW', 315, STATUS_OK) for _ in batch]
+
+    jobs = JobQueue()
+    job = jobs.get(jobs.submit([WindQuery('kioni', 38.4473, 20.695, DATE, '14:00')], fetch,
+                               scrape=scrape_native_steps, group=lambda queries: [queries]))
+    deadline = time.time() + 10
+    while not job.finished and time.time() < deadline:
+        time.sleep(0.01)
+
+    assert job.to_frame()['status'].tolist() == [STATUS_INTERPOLATED]
+    # the 12:00 and 15:00 steps around the requested hour
+    assert job.fetched == 2
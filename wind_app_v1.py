@@ -1,93 +1,33 @@
+import os
+
 import streamlit as st
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-import time
-from selenium.webdriver.firefox.options import Options as FirefoxOptions
-from selenium.webdriver.firefox.service import Service as FirefoxService
-from selenium.webdriver.common.action_chains import ActionChains
-import re
 import pandas as pd
-from webdriver_manager.firefox import GeckoDriverManager
-import pydeck as pdk
 import numpy as np
 
+from prefetch import load_config, DEFAULT_CONFIG as PREFETCH_CONFIG
+from app_common import (AVAILABLE_HOURS, DEFAULT_HOURS, submit_scrape, refresh_stale_button, poll_job,
+                        current_job, get_forecast_lookup, get_driver_pool)
+from query_planner import plan_route_queries, expand_aliases
+from route_wind import enrich_routes, departure_wind, STATUS_MISSING
+from route_profile import (route_legs, sample_legs, anchor_queries, route_profile, DEFAULT_BOAT_SPEED_KTS,
+                           DEFAULT_SPACING_NM)
+from perf_panel import show_performance_panel
+from passage_planner import cached_wind, passage_matrix, plan_trip, date_options, GUST_LIMIT_KTS
+from wind_map import wind_arrow_layer, wind_text_layer, speed_labels, wind_deck
 
-# Function to get wind data
-def get_wind_data(date, hour, latlong, progress_bar, status_text):
-    options = FirefoxOptions()
-    options.add_argument('--headless')
-    options.add_argument('--disable-gpu')
-    service = FirefoxService(executable_path=GeckoDriverManager().install())
-
-    driver = webdriver.Firefox(service=service, options=options)
-
-    try:
-        url = f'https://www.windfinder.com/#11/{latlong}/{date}T{hour}Z'
-        driver.get(url)
-        # Get the dimensions of the webpage
-        window_size = driver.get_window_size()
-        width = window_size['width']
-        height = window_size['height']
-        # Calculate the center coordinates
-        center_x = width // 2
-        center_y = height // 3
-        # Perform the mouse click in the center of the webpage
-        actions = ActionChains(driver)
-        actions.move_by_offset(center_x, center_y).click().perform()
-        time.sleep(3)
-        # Find all iframes on the page
-        iframes = driver.find_elements(By.TAG_NAME, 'iframe')
-        found = False
-        # Iterate through each iframe and try to switch to it
-        for index, iframe in enumerate(iframes):
-            try:
-                status_text.text(f"Attempting to switch to iframe {index + 1}")
-                driver.switch_to.frame(iframe)
-                status_text.text(f"Switched to iframe {index + 1}")
-                driver.switch_to.default_content()  # Switch back to the main content after testing
-                # look for the element
-                elements = driver.find_elements(By.CLASS_NAME, '_3KkQP69rYwNnTAe8GyxgmA')
-
-                speed = None
-                direction = None
-                direction_deg = None
-                for element in elements:
-                    status_text.text(f"Processing element: {element.text}")
-                    found = True
-                    text = element.text
-                    text = re.sub(r'[^\x00-\x7F]+', '', text)
-
-                    # structure the data - if (str) its a direction, if kts in text its strnegth
-                    if 'kts' in element.text:
-                        # format utf-8
-                        speed = int(text.split('kts')[0])
-                    if '°' in element.text:
-                        direction_deg = int(element.text.split('°')[0])
-                        direction = text.split('(')[1][:-1]
-                if found:
-                    break
-            except Exception as e:
-                status_text.text(f"Could not switch to iframe {index + 1}: {e}")
-    finally:
-        driver.quit()
-
-    return speed, direction, direction_deg
-
+# prefetch.json next to this file, whatever directory streamlit was started from
+PREFETCH_CONFIG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), PREFETCH_CONFIG)
 
 # Streamlit app
 st.title("Wind Data Finder")
 
+# start the drivers now, the first scrape should not wait for Firefox
+get_driver_pool()
+
 # Initialize session state for positions if not already done
 if 'positions' not in st.session_state:
-    st.session_state.positions = {
-        'lefkada_canal': [38.7825, 20.7322],
-        'meganisi': [38.623, 20.7707],
-        'atokos': [38.4729, 20.8170],
-        'kioni': [38.4473, 20.6950],
-        'filiatru': [38.3744, 20.7442],
-        'to_sivota': [38.5251, 20.5534],
-        'vathi': [38.3711, 20.7127]
-    }
+    # the harbours prefetch.py keeps fresh, so their forecasts are usually already in the store
+    st.session_state.positions = dict(load_config(PREFETCH_CONFIG_PATH)['positions'])
 
 if 'routes' not in st.session_state:
     st.session_state.routes = []
@@ -100,9 +40,7 @@ else:
     dates = [dates]
 
 # User input for hours
-available_hours = ['09:00', '12:00', '15:00', '18:00', '14:00', '17:00']
-default_hours = ['09:00', '14:00', '17:00']
-hours = st.multiselect('Select Hours', available_hours, default=default_hours)
+hours = st.multiselect('Select Hours', AVAILABLE_HOURS, default=DEFAULT_HOURS)
 
 # Tabs for main content, adding new positions, and managing routes
 tab1, tab2, tab3 = st.tabs(["Wind Data", "Manage Positions", "Manage Routes"])
@@ -143,6 +81,45 @@ with tab3:
             })
             st.success(f"Route for {date} saved from {from_pos} to {to_pos}")
 
+    # Suggest a leg per selected date from the forecasts already in the store and cache, nothing is scraped
+    st.header("Suggest Routes")
+    names = list(st.session_state.positions.keys())
+    plan_start = st.selectbox("Start from", ['(any)'] + names, key='plan_start')
+    plan_end = st.selectbox("End at", ['(any)'] + names, key='plan_end')
+    plan_speed = st.number_input('Boat speed (kts)', min_value=1.0, value=DEFAULT_BOAT_SPEED_KTS, key='plan_speed')
+    gust_limit = st.number_input('Gust limit (kts)', min_value=5.0, value=float(GUST_LIMIT_KTS))
+    if dates and hours and st.button("Suggest Routes"):
+        plan_dates = sorted(dates)
+        speed, direction_deg = cached_wind(st.session_state.positions, plan_dates, hours, get_forecast_lookup())
+        st.session_state.passage_matrix = passage_matrix(st.session_state.positions, plan_dates, speed,
+                                                         direction_deg, plan_speed, gust_limit)
+        start = None if plan_start == '(any)' else plan_start
+        end = None if plan_end == '(any)' else plan_end
+        st.session_state.suggested_routes = plan_trip(st.session_state.passage_matrix, start, end)
+        if st.session_state.suggested_routes is None:
+            uncached = int(np.isnan(speed).all(axis=2).sum())
+            if uncached:
+                st.warning(f"No sequence of legs fits the forecast. {uncached} of {speed.shape[0] * speed.shape[1]} "
+                           "position days have no cached forecast, get wind data for them first")
+            elif (start or end) and plan_trip(st.session_state.passage_matrix) is not None:
+                st.warning(f"No trip {f'from {start} ' if start else ''}{f'to {end} ' if end else ''}"
+                           "fits the forecast on the selected dates. Legs without that start and end do, "
+                           "pick other harbours or more dates")
+            else:
+                st.warning("No sequence of legs fits the forecast, on some day every leg is over the gust limit "
+                           "or outside the leg length")
+
+    if st.session_state.get('suggested_routes') is not None:
+        st.write(st.session_state.suggested_routes)
+        if st.button("Use Suggested Routes"):
+            st.session_state.routes = [{'date': row['date'], 'from': row['from'], 'to': row['to']}
+                                       for _, row in st.session_state.suggested_routes.iterrows()]
+            st.success(f"Saved {len(st.session_state.routes)} suggested routes")
+    if st.session_state.get('passage_matrix') is not None:
+        with st.expander("Legs that suit the forecast"):
+            option_date = st.selectbox("Date", st.session_state.passage_matrix.dates, key='option_date')
+            st.write(date_options(st.session_state.passage_matrix, option_date))
+
     # Display saved routes
     if st.session_state.routes:
         st.subheader("Saved Routes")
@@ -167,6 +144,8 @@ with tab1:
             to_coords = st.session_state.positions[route['to']]
             route_data.append({
                 'date': route['date'],
+                'from': route['from'],
+                'to': route['to'],
                 'from_lat': from_coords[0],
                 'from_lon': from_coords[1],
                 'to_lat': to_coords[0],
@@ -177,95 +156,67 @@ with tab1:
         route_df = pd.DataFrame(route_data)
         st.write(route_df)
 
-        # Button to start scraping
+        # Only scrape what the saved routes need
+        queries, aliases = plan_route_queries(st.session_state.routes, st.session_state.positions, hours)
+        full_grid = len(dates) * len(hours) * len(st.session_state.positions)
+
+        # Wind along the routes, interpolated from the forecast grid points around them.
+        # Off by default, the grid points around every leg add many queries
+        profile_routes = st.checkbox('Wind along routes', value=False) and bool(hours)
+        if profile_routes:
+            departure_hour = st.selectbox('Departure hour', sorted(hours))
+            boat_speed = st.number_input('Boat speed (kts)', min_value=1.0, value=DEFAULT_BOAT_SPEED_KTS)
+            spacing = st.number_input('Sample every (nm)', min_value=0.1, value=DEFAULT_SPACING_NM)
+            legs = route_legs(st.session_state.routes, st.session_state.positions, departure_hour)
+            samples = sample_legs(legs, spacing, boat_speed)
+            profile_queries = anchor_queries(samples)
+            queries = queries + profile_queries
+            st.write(f"Route profile: {len(samples)} samples from {len(profile_queries)} grid point queries")
+        st.write(f"Planned queries: {len(queries)}"
+                 + (f" ({len(profile_queries)} of them for the wind along routes)" if profile_routes else '')
+                 + f", the full position grid would be {full_grid}")
+
+        # Button to start scraping. The scrape runs as a background job so reruns do not lose it
+        # cProfile every fetch of the next scrape, the report shows in the performance panel
+        profile_scrape = st.checkbox('Profile the next scrape')
         if st.button('Get Wind Data'):
-            total_tasks = len(dates) * len(hours) * len(route_df)
-            progress_bar = st.progress(0)
-            progress = 0
-            status_text = st.empty()
+            submit_scrape(queries, profile=profile_scrape)
 
-            output = pd.DataFrame(columns=['pos', 'date', 'hour', 'speed', 'direction', 'direction_deg'])
-            for date in dates:
-                for hour in hours:
-                    for pos, coords in st.session_state.positions.items():
-                        status_text.text(f'Getting data for {pos} {date} at {hour}')
-                        latlong = str(coords[0]) + '/' + str(coords[1])
-                        data = get_wind_data(date, hour, latlong, progress_bar, status_text)
-                        output = pd.concat([output, pd.DataFrame(
-                            {'pos': pos, 'date': date, 'hour': hour, 'speed': data[0], 'direction': data[1],
-                             'direction_deg': data[2]}, index=[0])])
-                        progress += 1
-                        progress_bar.progress(np.min([1,progress / total_tasks]))
+        refresh_stale_button(name_column='pos')
 
-            # Display the results
+        output = poll_job(name_column='pos')
+        if output is not None:
+            output = expand_aliases(output, aliases)
             st.write(output)
 
             # Update route data with wind information
-            for i, route in enumerate(route_data):
-                latlong_from = f"{route['from_lat']}/{route['from_lon']}"
-                # wind_speed, wind_direction, wind_direction_deg = get_wind_data(route['date'], hours[0], latlong_from,
-                #                                                                progress_bar, status_text)
-                wind_speed = output[(output['pos'] == route['from']) & (output['date'] == route['date'])]['speed'].values[0]
-                wind_direction = output[(output['pos'] == route['from']) & (output['date'] == route['date'])]['direction'].values[0]
-                wind_direction_deg = output[(output['pos'] == route['from']) & (output['date'] == route['date'])]['direction_deg'].values[0]
-                route_data[i]['wind_speed'] = wind_speed
-                route_data[i]['wind_direction_deg'] = wind_direction_deg
+            route_wind = enrich_routes(route_df, output, hours)
+            missing = route_wind[route_wind['wind_status'] == STATUS_MISSING]
+            if len(missing):
+                st.warning(f"No forecast for {len(missing)} route hours: "
+                           + ", ".join(f"{row['from']} {row['date']} {row['hour']}" for _, row in missing.iterrows()))
+            st.write(route_wind)
 
-            route_df = pd.DataFrame(route_data)
-            st.write(route_df)
+            # One arrow per route with the wind at its earliest selected hour
+            route_df = departure_wind(route_wind)
 
             # Create map layers for routes with wind speed and direction
-            layers = []
-            for _, row in route_df.iterrows():
-                arrow_length = 0.01  # Length of the arrow
-                direction_rad = row['wind_direction_deg'] * (3.14159265 / 180)  # Convert to radians
-                layers.append(pdk.Layer(
-                    "PathLayer",
-                    data=pd.DataFrame([{
-                        'path': [
-                            [row['from_lon'], row['from_lat']],
-                            [row['from_lon'] + arrow_length * np.cos(direction_rad),
-                             row['from_lat'] + arrow_length * np.sin(direction_rad)]
-                        ],
-                        'wind_speed': row['wind_speed']
-                    }]),
-                    get_path='path',
-                    get_width=2,
-                    get_color=[0, 0, 255],
-                    pickable=True,
-                ))
-                layers.append(pdk.Layer(
-                    "TextLayer",
-                    data=pd.DataFrame([{
-                        'coordinates': [row['from_lon'], row['from_lat']],
-                        'text': f"{row['wind_speed']} kts"
-                    }]),
-                    get_position="coordinates",
-                    get_text="text",
-                    get_size=16,
-                    get_color=[0, 0, 0],
-                    get_alignment_baseline="'bottom'",
-                ))
-                layers.append(pdk.Layer(
-                    "TextLayer",
-                    data=pd.DataFrame([{
-                        'coordinates': [row['to_lon'], row['to_lat']],
-                        'text': f"{row['wind_speed']} kts"
-                    }]),
-                    get_position="coordinates",
-                    get_text="text",
-                    get_size=16,
-                    get_color=[0, 0, 0],
-                    get_alignment_baseline="'bottom'",
-                ))
-
-            st.pydeck_chart(pdk.Deck(
-                map_style="mapbox://styles/mapbox/light-v10",
-                initial_view_state=pdk.ViewState(
-                    latitude=38.5,
-                    longitude=20.7,
-                    zoom=8,
-                    pitch=50,
-                ),
-                layers=layers
-            ))
+            labels = speed_labels(route_df['wind_speed'])
+            layers = [
+                wind_arrow_layer(route_df['from_lat'], route_df['from_lon'], route_df['wind_direction_deg'],
+                                 route_df['wind_speed']),
+                wind_text_layer(np.concatenate([route_df['from_lat'], route_df['to_lat']]),
+                                np.concatenate([route_df['from_lon'], route_df['to_lon']]),
+                                labels + labels),
+            ]
+
+            if profile_routes:
+                st.subheader("Wind along routes")
+                profile = route_profile(legs, output, spacing, boat_speed)
+                st.write(profile)
+                layers.append(wind_arrow_layer(profile['lat'], profile['lon'], profile['direction_deg'],
+                                               profile['speed']))
+
+            st.pydeck_chart(wind_deck(layers))
+
+    show_performance_panel(current_job())
@@ -0,0 +1,79 @@
+import numpy as np
+import pandas as pd
+import pydeck as pdk
+
+ARROW_LENGTH = 0.01  # Length of the arrow in degrees
+# arrows go from blue in calm air to red at this speed and above
+MAX_COLOR_SPEED = 30
+CALM_COLOR = np.array([0, 0, 255])
+STRONG_COLOR = np.array([255, 0, 0])
+
+
+# RGB colour per speed, blended from CALM_COLOR to STRONG_COLOR
+def speed_colors(speeds, max_speed=MAX_COLOR_SPEED):
+    weight = np.clip(np.nan_to_num(np.asarray(speeds, dtype=float)) / max_speed, 0, 1)[:, None]
+    return ((1 - weight) * CALM_COLOR + weight * STRONG_COLOR).astype(int)
+
+
+# One PathLayer with a wind arrow for every row that has a direction, coloured by speed.
+# All arrow endpoints are computed in one pass
+def wind_arrow_layer(lats, lons, directions_deg, speeds, arrow_length=ARROW_LENGTH):
+    lats = np.asarray(lats, dtype=float)
+    lons = np.asarray(lons, dtype=float)
+    directions_deg = pd.array(directions_deg, dtype='Float64').to_numpy(dtype=float, na_value=np.nan)
+    speeds = pd.array(speeds, dtype='Float64').to_numpy(dtype=float, na_value=np.nan)
+    drawn = ~np.isnan(directions_deg)
+    lats, lons, speeds = lats[drawn], lons[drawn], speeds[drawn]
+    direction_rad = np.radians(directions_deg[drawn])
+
+    starts = np.column_stack([lons, lats])
+    ends = starts + arrow_length * np.column_stack([np.cos(direction_rad), np.sin(direction_rad)])
+    return pdk.Layer(
+        "PathLayer",
+        data=pd.DataFrame({
+            'path': np.stack([starts, ends], axis=1).tolist(),
+            # missing speeds become null, NaN is not valid JSON
+            'wind_speed': np.where(np.isnan(speeds), None, speeds),
+            'color': speed_colors(speeds).tolist(),
+        }),
+        get_path='path',
+        get_width=2,
+        get_color='color',
+        pickable=True,
+    )
+
+
+# One TextLayer with a label at every point
+def wind_text_layer(lats, lons, texts):
+    return pdk.Layer(
+        "TextLayer",
+        data=pd.DataFrame({
+            'coordinates': np.column_stack([np.asarray(lons, dtype=float), np.asarray(lats, dtype=float)]).tolist(),
+            'text': list(texts),
+        }),
+        get_position="coordinates",
+        get_text="text",
+        get_size=16,
+        get_color=[0, 0, 0],
+        get_alignment_baseline="'bottom'",
+    )
+
+
+def speed_labels(speeds, prefixes=None):
+    labels = pd.Series(pd.array(speeds, dtype='Int16')).astype('string').fillna('?') + ' kts'
+    if prefixes is not None:
+        labels = pd.Series(np.asarray(prefixes, dtype=str)) + ': ' + labels
+    return labels.tolist()
+
+
+def wind_deck(layers, latitude=38.5, longitude=20.7):
+    return pdk.Deck(
+        map_style="mapbox://styles/mapbox/light-v10",
+        initial_view_state=pdk.ViewState(
+            latitude=latitude,
+            longitude=longitude,
+            zoom=8,
+            pitch=50,
+        ),
+        layers=layers
+    )
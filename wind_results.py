@@ -0,0 +1,70 @@
+import numpy as np
+import pandas as pd
+
+
+class ResultBuffer:
+    # Column buffers for scrape results, sized up front for the whole query grid.
+    # Rows are written in place as results arrive and the DataFrame is built once at the end,
+    # with categorical names/directions/statuses and nullable int16 speeds and degrees
+
+    def __init__(self, size):
+        self._size = 0
+        self._allocate(max(size, 1))
+
+    def _allocate(self, capacity):
+        old = getattr(self, '_columns', None)
+        self._columns = {
+            'name': np.empty(capacity, dtype=object),
+            'lat': np.full(capacity, np.nan),
+            'lon': np.full(capacity, np.nan),
+            'date': np.empty(capacity, dtype=object),
+            'hour': np.empty(capacity, dtype=object),
+            'speed': np.zeros(capacity, dtype=np.int16),
+            'speed_missing': np.ones(capacity, dtype=bool),
+            'direction': np.empty(capacity, dtype=object),
+            'direction_deg': np.zeros(capacity, dtype=np.int16),
+            'direction_deg_missing': np.ones(capacity, dtype=bool),
+            'status': np.empty(capacity, dtype=object),
+        }
+        if old is not None:
+            for key, column in old.items():
+                self._columns[key][:self._size] = column[:self._size]
+
+    def __len__(self):
+        return self._size
+
+    def add(self, query, reading):
+        if self._size == len(self._columns['name']):
+            self._allocate(2 * self._size)
+        columns = self._columns
+        i = self._size
+        columns['name'][i] = query.name
+        columns['lat'][i] = query.lat
+        columns['lon'][i] = query.lon
+        columns['date'][i] = query.date
+        columns['hour'][i] = query.hour
+        if reading.speed is not None:
+            columns['speed'][i] = reading.speed
+            columns['speed_missing'][i] = False
+        columns['direction'][i] = reading.direction
+        if reading.direction_deg is not None:
+            columns['direction_deg'][i] = reading.direction_deg
+            columns['direction_deg_missing'][i] = False
+        columns['status'][i] = reading.status
+        self._size += 1
+
+    def to_frame(self, name_column='name'):
+        n = self._size
+        columns = self._columns
+        return pd.DataFrame({
+            name_column: pd.Categorical(columns['name'][:n]),
+            'lat': columns['lat'][:n].copy(),
+            'lon': columns['lon'][:n].copy(),
+            'date': columns['date'][:n].copy(),
+            'hour': columns['hour'][:n].copy(),
+            'speed': pd.arrays.IntegerArray(columns['speed'][:n].copy(), columns['speed_missing'][:n].copy()),
+            'direction': pd.Categorical(columns['direction'][:n]),
+            'direction_deg': pd.arrays.IntegerArray(columns['direction_deg'][:n].copy(),
+                                                    columns['direction_deg_missing'][:n].copy()),
+            'status': pd.Categorical(columns['status'][:n]),
+        })
@@ -0,0 +1,278 @@
+import threading
+import time
+import re
+from collections import deque, namedtuple
+
+import numpy as np
+from selenium.common.exceptions import TimeoutException
+from selenium.webdriver.common.action_chains import ActionChains
+from selenium.webdriver.support.ui import WebDriverWait
+
+from driver_pool import WINDOW_WIDTH, WINDOW_HEIGHT
+from scrape_metrics import (metrics, STAGE_PAGE_LOAD, STAGE_CLICK, STAGE_TOOLTIP_WAIT, STAGE_TOOLTIP_SCRIPT,
+                            STAGE_PARSE)
+
+WINDFINDER_HOST = 'www.windfinder.com'
+MAP_ZOOM = 11
+TILE_SIZE = 256
+# keep clicks this many pixels away from the window edges
+VIEWPORT_MARGIN = 80
+# element holding the speed and direction texts of the map tooltip
+TOOLTIP_CLASS = '_3KkQP69rYwNnTAe8GyxgmA'
+
+# How a query ended
+STATUS_OK = 'ok'
+STATUS_TIMEOUT = 'timeout'
+STATUS_PARSE_ERROR = 'parse_error'
+STATUS_ERROR = 'error'
+STATUS_CACHED = 'cached'
+
+# Collects the tooltip texts of the main document and of same-origin iframes in one round trip,
+# split into speed ("12 kts") and direction ("225° (SW)") candidates.
+# Called with mark=true right before a click, it only remembers which tooltip elements are shown
+# and where. A later read returns the texts of tooltip elements that are new or have moved since,
+# i.e. the ones the click opened, so the previous point's tooltip never answers for the next point.
+# The marks are kept on window properties, the page's DOM is left alone
+READ_TOOLTIP_SCRIPT = """
+var cls = arguments[0];
+var mark = arguments[1];
+var docs = [document];
+document.querySelectorAll('iframe').forEach(function (frame) {
+    try { if (frame.contentDocument) { docs.push(frame.contentDocument); } } catch (e) {}
+});
+var result = {speed: [], direction: []};
+docs.forEach(function (doc) {
+    var win = doc.defaultView;
+    if (!win) { return; }
+    var shown = [];
+    var positions = [];
+    doc.querySelectorAll('.' + cls).forEach(function (element) {
+        var rect = element.getBoundingClientRect();
+        if (rect.width || rect.height) {
+            shown.push(element);
+            positions.push(Math.round(rect.left) + ',' + Math.round(rect.top));
+        }
+    });
+    if (mark) {
+        win.__windTooltipMark = {elements: shown, positions: positions};
+        return;
+    }
+    var before = win.__windTooltipMark || {elements: [], positions: []};
+    shown.forEach(function (element, i) {
+        var j = before.elements.indexOf(element);
+        if (j !== -1 && before.positions[j] === positions[i]) { return; }
+        var text = (element.innerText || element.textContent || '').trim();
+        if (text.indexOf('kts') !== -1) { result.speed.push(text); }
+        if (text.indexOf('\u00b0') !== -1) { result.direction.push(text); }
+    });
+});
+return result;
+"""
+SPEED_RE = re.compile(r'(\d+)\s*kts')
+DIRECTION_RE = re.compile(r'(\d+)\s*\u00b0[^(]*\(([^)]*)\)')
+NON_ASCII_RE = re.compile(r'[^\x00-\x7F]+')
+
+WindReading = namedtuple('WindReading', ['speed', 'direction', 'direction_deg', 'status'])
+
+POLL_INTERVAL = 0.1
+
+
+class LatencyTracker:
+    # Keeps the most recent query latencies and derives the query deadline from them:
+    # a few times the 95th percentile, clamped so one slow page cannot stretch it forever.
+    # A query that timed out is added at its deadline, so the deadline grows when the site slows
+    # down instead of only learning from the queries that made it in time
+
+    def __init__(self, window=50, min_samples=5, factor=2.0, min_timeout=5.0, max_timeout=30.0,
+                 default_timeout=20.0):
+        self.min_samples = min_samples
+        self.factor = factor
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.default_timeout = default_timeout
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def add(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def timeout(self):
+        with self._lock:
+            samples = list(self._samples)
+        if len(samples) < self.min_samples:
+            return self.default_timeout
+        return float(np.clip(self.factor * np.percentile(samples, 95), self.min_timeout, self.max_timeout))
+
+
+# Shared by every worker of the process
+load_latencies = LatencyTracker()
+
+
+def show_status(status_text, message):
+    if status_text is not None:
+        status_text.text(message)
+
+
+# Web Mercator world pixel coordinates of lat/lon at a zoom level, works on arrays too
+def project(lat, lon, zoom=MAP_ZOOM):
+    scale = TILE_SIZE * 2 ** zoom
+    x = (np.asarray(lon, dtype=float) + 180) / 360 * scale
+    sin_lat = np.sin(np.radians(np.asarray(lat, dtype=float)))
+    y = (0.5 - np.log((1 + sin_lat) / (1 - sin_lat)) / (4 * np.pi)) * scale
+    return x, y
+
+
+def unproject(x, y, zoom=MAP_ZOOM):
+    scale = TILE_SIZE * 2 ** zoom
+    lon = np.asarray(x, dtype=float) / scale * 360 - 180
+    lat = np.degrees(np.arctan(np.sinh(np.pi * (1 - 2 * np.asarray(y, dtype=float) / scale))))
+    return lat, lon
+
+
+# Group points that fit in one map viewport around the click anchor.
+# Returns (center_lat, center_lon, [(point index, click x, click y), ...]) per viewport,
+# center being the lat/lon to put in the URL so every point of the group lands on screen
+def viewport_groups(points, width=WINDOW_WIDTH, height=WINDOW_HEIGHT, margin=VIEWPORT_MARGIN):
+    if not points:
+        return []
+    anchor_x, anchor_y = click_anchor(width, height)
+    xs, ys = project([p[0] for p in points], [p[1] for p in points])
+    usable_width = width - 2 * margin
+    usable_height = height - 2 * margin
+
+    groups = []
+    for index in np.lexsort((xs, ys)):
+        for group in groups:
+            members = group + [index]
+            if (np.ptp(xs[members]) <= usable_width) and (np.ptp(ys[members]) <= usable_height):
+                group.append(index)
+                break
+        else:
+            groups.append([index])
+
+    viewports = []
+    for group in groups:
+        # put the middle of the group in the middle of the window
+        mid_x = (xs[group].min() + xs[group].max()) / 2
+        mid_y = (ys[group].min() + ys[group].max()) / 2
+        center_x = mid_x + anchor_x - width / 2
+        center_y = mid_y + anchor_y - height / 2
+        center_lat, center_lon = unproject(center_x, center_y)
+        clicks = [(int(i), int(round(xs[i] - center_x + anchor_x)), int(round(ys[i] - center_y + anchor_y)))
+                  for i in group]
+        viewports.append((round(float(center_lat), 4), round(float(center_lon), 4), clicks))
+    return viewports
+
+
+# The URL's lat/lon sits under this pixel of the window
+def click_anchor(width=WINDOW_WIDTH, height=WINDOW_HEIGHT):
+    return width // 2, height // 3
+
+
+# Load the windfinder map centered on lat/lon, False if it did not load before the timeout.
+# A pooled driver is usually still on the map, and a URL that only differs after the '#' would be
+# a same-document navigation without a reload. It is reloaded then, so the map is always built
+# from the URL and the page load timeout applies
+def load_map(driver, lat, lon, date, hour, timeout, status_text=None):
+    latlong = f"{lat}/{lon}"
+    url = f'https://{WINDFINDER_HOST}/#{MAP_ZOOM}/{latlong}/{date}T{hour}Z'
+    driver.set_page_load_timeout(timeout)
+    try:
+        with metrics.stage(STAGE_PAGE_LOAD):
+            same_document = driver.current_url.split('#')[0] == url.split('#')[0]
+            driver.get(url)
+            if same_document:
+                driver.refresh()
+    except TimeoutException:
+        show_status(status_text, f"Page did not load within {timeout:.1f}s")
+        return False
+    return True
+
+
+# Click the map at window pixel (x, y) and wait for the tooltip that click opens to show the wind there
+def click_and_read(driver, x, y, deadline, status_text=None):
+    # Remember the tooltips shown before the click, the answer has to come from another one
+    with metrics.stage(STAGE_TOOLTIP_SCRIPT):
+        driver.execute_script(READ_TOOLTIP_SCRIPT, TOOLTIP_CLASS, True)
+    # Perform the mouse click on the webpage
+    with metrics.stage(STAGE_CLICK):
+        actions = ActionChains(driver)
+        actions.move_by_offset(x, y).click().perform()
+        # release the pointer so the next offset is measured from the corner again
+        actions.reset_actions()
+    # Poll until the tooltip elements hold parseable text or the deadline passes
+    seen = []
+    try:
+        wait = WebDriverWait(driver, max(deadline - time.monotonic(), POLL_INTERVAL), poll_frequency=POLL_INTERVAL)
+        with metrics.stage(STAGE_TOOLTIP_WAIT):
+            reading = wait.until(lambda d: wind_ready(d, seen))
+    except TimeoutException:
+        if seen:
+            show_status(status_text, f"Could not parse wind data from {seen[-1]}")
+            return WindReading(None, None, None, STATUS_PARSE_ERROR)
+        show_status(status_text, "No wind data before the deadline")
+        return WindReading(None, None, None, STATUS_TIMEOUT)
+    return WindReading(*reading, STATUS_OK)
+
+
+# Read the wind at many points of the same date and hour, loading the map once per viewport.
+# Returns one WindReading per point, in the order of `points`
+def read_wind_batch(driver, points, date, hour, status_text=None, timeout=None):
+    if timeout is None:
+        timeout = load_latencies.timeout()
+    readings = [None] * len(points)
+    for center_lat, center_lon, clicks in viewport_groups(points):
+        started = time.monotonic()
+        if not load_map(driver, center_lat, center_lon, date, hour, timeout, status_text):
+            load_latencies.add(timeout)
+            for index, _, _ in clicks:
+                readings[index] = WindReading(None, None, None, STATUS_TIMEOUT)
+            continue
+        for n, (index, x, y) in enumerate(clicks):
+            if n > 0:
+                started = time.monotonic()
+            readings[index] = click_and_read(driver, x, y, started + timeout, status_text)
+            # only the first click pays for the page load, the later ones take a fraction of it and
+            # would pull the deadline below what a page load needs
+            if n == 0 and readings[index].status in (STATUS_OK, STATUS_TIMEOUT):
+                load_latencies.add(time.monotonic() - started)
+    return readings
+
+
+# Readiness check for WebDriverWait, returns the parsed reading or False to keep waiting.
+# One script call per poll collects the candidate texts of the tooltips opened since the click
+def wind_ready(driver, seen):
+    with metrics.stage(STAGE_TOOLTIP_SCRIPT):
+        candidates = driver.execute_script(READ_TOOLTIP_SCRIPT, TOOLTIP_CLASS, False)
+    if not candidates['speed'] and not candidates['direction']:
+        return False
+    seen[:] = [candidates['speed'] + candidates['direction']]
+    with metrics.stage(STAGE_PARSE):
+        speed, direction, direction_deg = parse_wind_candidates(candidates)
+    if speed is None or direction_deg is None:
+        return False
+    return speed, direction, direction_deg
+
+
+# Parse {'speed': [...], 'direction': [...]} tooltip texts, the last parseable text of each kind wins
+def parse_wind_candidates(candidates):
+    speed = None
+    direction = None
+    direction_deg = None
+    for text in candidates['speed']:
+        match = SPEED_RE.search(text)
+        if match:
+            speed = int(match.group(1))
+    for text in candidates['direction']:
+        match = DIRECTION_RE.search(text)
+        if match:
+            direction_deg = int(match.group(1))
+            direction = NON_ASCII_RE.sub('', match.group(2)).strip()
+    return speed, direction, direction_deg
+
+
+# Read points sharing a date and hour with a driver checked out of the shared pool
+def get_wind_batch(points, date, hour, pool, status_text=None, timeout=None):
+    with pool.driver() as driver:
+        return read_wind_batch(driver, points, date, hour, status_text, timeout)
@@ -0,0 +1,188 @@
+import datetime
+import json
+import socket
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import defaultdict
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from scrape_executor import group_by_viewport
+from scrape_metrics import metrics, STAGE_HTTP_REQUEST, STAGE_HTTP_PARSE
+from wind_scraper import (WindReading, WINDFINDER_HOST, STATUS_OK, STATUS_TIMEOUT, STATUS_PARSE_ERROR,
+                          get_wind_batch)
+
+COMPASS = ['N', 'NNE', 'NE', 'ENE', 'E', 'ESE', 'SE', 'SSE', 'S', 'SSW', 'SW', 'WSW', 'W', 'WNW', 'NW', 'NNW']
+
+# Forecast data endpoint behind the map and the fields of each time step it returns.
+# The endpoint is not documented, keep these in one place so they can follow the site
+FORECAST_URL = 'https://api.windfinder.com/v2/forecast'
+FORECAST_TIME_FIELD = 'dtl'
+FORECAST_SPEED_FIELD = 'ws'
+FORECAST_DIRECTION_FIELD = 'wd'
+
+
+def compass_point(direction_deg):
+    return COMPASS[int((direction_deg % 360) / 22.5 + 0.5) % 16]
+
+
+class WindSource:
+    # Where wind readings come from. fetch_batch takes WindQuery cells sharing a date and hour
+    # and returns one WindReading per query, group splits a query list into such batches.
+    # Pass source.fetch_batch, source.group, source.host and source.fallback to scrape_grid
+    name = 'base'
+    host = None
+    # source for whatever this one could not answer, see FallbackWindSource
+    fallback = None
+
+    def fetch_batch(self, queries):
+        raise NotImplementedError
+
+    def group(self, queries):
+        by_time = defaultdict(list)
+        for query in queries:
+            by_time[(query.date, query.hour)].append(query)
+        return list(by_time.values())
+
+    def fetch(self, query):
+        return self.fetch_batch([query])[0]
+
+    def close(self):
+        pass
+
+
+class SeleniumWindSource(WindSource):
+    # The live windfinder map, read through pooled Firefox drivers
+    name = 'selenium'
+    host = WINDFINDER_HOST
+
+    def __init__(self, pool, timeout=None):
+        self.pool = pool
+        self.timeout = timeout
+
+    def fetch_batch(self, queries):
+        return get_wind_batch([(q.lat, q.lon) for q in queries], queries[0].date, queries[0].hour, self.pool,
+                              timeout=self.timeout)
+
+    def group(self, queries):
+        return group_by_viewport(queries)
+
+
+class ReplayWindSource(WindSource):
+    # Readings served by a local stand-in (see replay_server.py), for measuring the scrape
+    # machinery and regression testing without the network
+    name = 'replay'
+
+    def __init__(self, base_url, timeout=10.0, max_batch=20):
+        self.base_url = base_url.rstrip('/')
+        self.host = urllib.parse.urlsplit(self.base_url).netloc
+        self.timeout = timeout
+        self.max_batch = max_batch
+
+    def group(self, queries):
+        return [batch[i:i + self.max_batch] for batch in super().group(queries)
+                for i in range(0, len(batch), self.max_batch)]
+
+    def fetch_batch(self, queries):
+        params = urllib.parse.urlencode({
+            'date': str(queries[0].date),
+            'hour': queries[0].hour,
+            'points': ';'.join(f'{q.lat},{q.lon}' for q in queries),
+        })
+        try:
+            with urllib.request.urlopen(f'{self.base_url}/wind?{params}', timeout=self.timeout) as response:
+                body = json.load(response)
+        except urllib.error.URLError as e:
+            if not isinstance(e.reason, (socket.timeout, TimeoutError)):
+                raise
+            return [WindReading(None, None, None, STATUS_TIMEOUT)] * len(queries)
+        except (socket.timeout, TimeoutError):
+            return [WindReading(None, None, None, STATUS_TIMEOUT)] * len(queries)
+        except ValueError:
+            return [WindReading(None, None, None, STATUS_PARSE_ERROR)] * len(queries)
+        return [WindReading(item['speed'], item['direction'], item['direction_deg'], STATUS_OK)
+                for item in body['readings']]
+
+
+# 'YYYY-MM-DDTHH:MM' in UTC, the form the map URL uses for {date}T{hour}Z
+def utc_slot(value):
+    moment = datetime.datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(datetime.timezone.utc)
+    return moment.strftime('%Y-%m-%dT%H:%M')
+
+
+class HttpForecastSource(WindSource):
+    # Reads the forecast data endpoint directly instead of rendering the map.
+    # One request returns every time step for a point, so a batch is all the dates and hours
+    # wanted at one position. Requests share a keep-alive connection pool
+    name = 'http'
+
+    def __init__(self, url=FORECAST_URL, timeout=10.0, pool_size=8, session=None):
+        self.url = url
+        self.host = urllib.parse.urlsplit(url).netloc
+        self.timeout = timeout
+        self.session = session or requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def group(self, queries):
+        by_point = defaultdict(list)
+        for query in queries:
+            by_point[(query.lat, query.lon)].append(query)
+        return list(by_point.values())
+
+    def fetch_batch(self, queries):
+        try:
+            with metrics.stage(STAGE_HTTP_REQUEST):
+                response = self.session.get(self.url, params={'lat': queries[0].lat, 'lon': queries[0].lon},
+                                            timeout=self.timeout)
+        except requests.Timeout:
+            return [WindReading(None, None, None, STATUS_TIMEOUT)] * len(queries)
+        response.raise_for_status()
+        try:
+            with metrics.stage(STAGE_HTTP_PARSE):
+                steps = {utc_slot(step[FORECAST_TIME_FIELD]): step for step in response.json()}
+        except (ValueError, KeyError, TypeError):
+            return [WindReading(None, None, None, STATUS_PARSE_ERROR)] * len(queries)
+
+        readings = []
+        for query in queries:
+            step = steps.get(f'{query.date}T{query.hour}')
+            try:
+                direction_deg = int(round(float(step[FORECAST_DIRECTION_FIELD]))) % 360
+                speed = int(round(float(step[FORECAST_SPEED_FIELD])))
+            except (TypeError, KeyError, ValueError):
+                # no step at that time or a malformed one
+                readings.append(WindReading(None, None, None, STATUS_PARSE_ERROR))
+                continue
+            readings.append(WindReading(speed, compass_point(direction_deg), direction_deg, STATUS_OK))
+        return readings
+
+    def close(self):
+        self.session.close()
+
+
+class FallbackWindSource(WindSource):
+    # Try the fast source first and send whatever it could not answer to the fallback,
+    # typically HttpForecastSource in front of SeleniumWindSource.
+    # fetch_batch, group and host are the primary's. scrape_grid collects the failures of every
+    # primary batch and regroups them for the fallback, which is rate limited on its own host
+    def __init__(self, primary, fallback):
+        self.primary = primary
+        self.fallback = fallback
+        self.name = f'{primary.name}+{fallback.name}'
+        self.host = primary.host
+
+    def group(self, queries):
+        return self.primary.group(queries)
+
+    def fetch_batch(self, queries):
+        return self.primary.fetch_batch(queries)
+
+    def close(self):
+        self.primary.close()
+        self.fallback.close()